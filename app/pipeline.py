@@ -0,0 +1,383 @@
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+import pandas as pd
+from sqlalchemy.engine import make_url
+from app.report_writer import generate_report_stream, remove_think_blocks, summarize_sql
+from app.slides_planner import ask_llm_for_slides, deduplicate_charts
+from app.reveal_generator import generate_reveal_html
+from core import tracing
+from core.adapter import DBAdapter
+from core.schema_catalog import schema_catalog
+
+# --- Result size limits for CoT queries (bounded memory for LLM-generated SQL) ---
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", 100000))
+MAX_RESULT_BYTES = int(os.getenv("MAX_RESULT_MB", 256)) * 1024 * 1024
+# Arrow-backed result columns ("pyarrow") use several times less memory for text; set to "" for numpy/object
+RESULT_DTYPE_BACKEND = os.getenv("RESULT_DTYPE_BACKEND", "pyarrow") or None
+# Report statistics: "sql" computes them in the database, "pandas" from the fetched rows,
+# "auto" uses the database only when a step result was truncated
+PROFILE_MODE = os.getenv("PROFILE_MODE", "auto").lower()
+# Auto Plan: "sequential" asks for one sub-question per round, "batch" for up to PLAN_BATCH_SIZE independent ones
+PLAN_MODE = os.getenv("PLAN_MODE", "sequential").lower()
+PLAN_BATCH_SIZE = int(os.getenv("PLAN_BATCH_SIZE", 4))
+# Upper bound on planned sub-questions, so a model that never answers DONE can't loop forever
+MAX_PLAN_STEPS = int(os.getenv("MAX_PLAN_STEPS", 12))
+
+DONE_MARKER = "DONE, NO MORE QUESTIONS ARE NEEDED!"
+
+
+def _join_tokens(tokens) -> str:
+    return "".join(tokens)
+
+
+class ReportPipeline:
+    """
+    Question → chain-of-thought plan → SQL → report → slides, as explicit stages:
+
+        plan_next      ask the LLM for the next sub-question(s) and their SQL
+        execute        run the planned SQL (concurrently for a batch)
+        summarize      statistics for the report (in the database or in pandas)
+        write_report   stream the report from the LLM
+        plan_slides    ask the LLM for a slide outline
+        render_slides  build the Reveal.js HTML
+
+    run() chains the stages headlessly (CLI, batch jobs, benchmarks); the Streamlit app
+    calls the same stages one by one to show progress. LLM output is streamed through
+    the optional `render(tokens) -> text` callables (default: collected silently).
+    Every stage call appends {"stage", "seconds"} to `timings` and is traced as a
+    "pipeline.<stage>" span (see core/tracing.py), parent of the LLM, SQL and render spans.
+    """
+
+    def __init__(self, vn, db_adapter: DBAdapter | None = None, api_key: str | None = None,
+                 max_rows: int | None = MAX_RESULT_ROWS, max_bytes: int | None = MAX_RESULT_BYTES,
+                 plan_mode: str = PLAN_MODE, plan_batch_size: int = PLAN_BATCH_SIZE,
+                 profile_mode: str = PROFILE_MODE, max_steps: int = MAX_PLAN_STEPS):
+        self.vn = vn
+        self.db_adapter = db_adapter if db_adapter is not None else vn.db_adapter
+        self.api_key = api_key if api_key is not None else os.getenv("LLM_API_KEY")
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.plan_mode = plan_mode
+        self.plan_batch_size = plan_batch_size
+        self.profile_mode = profile_mode
+        self.max_steps = max_steps
+        self.timings = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"pipeline.{name}"):
+                yield
+        finally:
+            self.timings.append({"stage": name, "seconds": time.perf_counter() - start})
+
+    def stage_totals(self) -> dict:
+        """Total seconds per stage name, in first-seen order"""
+        totals = {}
+        for timing in self.timings:
+            totals[timing["stage"]] = totals.get(timing["stage"], 0.0) + timing["seconds"]
+        return totals
+
+    # --- Planning ---
+
+    def _schema(self) -> str:
+        # From this pipeline's adapter: the agent is shared, and its db_adapter may be another session's
+        if self.db_adapter is None:
+            return ""
+        with tracing.span("schema"):
+            try:
+                return schema_catalog.describe(self.db_adapter)
+            except Exception as e:
+                print(f"Error extracting all tables schema: {e}")
+                return ""
+
+    def build_plan_prompt(self, request: str, steps: list) -> str:
+        # Đưa lại subquestion và kết quả từng step vào prompt, không đưa SQL, loại bỏ '__source__' khỏi result
+        def clean_result(result):
+            if isinstance(result, list):
+                return [
+                    {k: v for k, v in row.items() if k != "__source__"}
+                    for row in result
+                ]
+            return result
+        context = "\n".join([
+            f"Step {i+1}:\nSubquestion: {c['subquestion']}\nResult: {json.dumps(clean_result(c.get('result', '')), ensure_ascii=False, indent=2, default=str)}"
+            for i, c in enumerate(steps)
+        ])
+
+        if self.plan_mode == "batch":
+            next_instruction = f"""What are the next subquestions you should answer to help generate the report?
+List up to {self.plan_batch_size} subquestions that do NOT depend on each other's results (they are executed in parallel).
+Respond in JSON format: [{{ "subquestion": "...", "sql": "..." }}, ...]"""
+        else:
+            next_instruction = """What is the next subquestion you should answer to help generate the report?
+Respond in JSON format: { "subquestion": "...", "sql": "..." }"""
+
+        return f"""
+You are an analytical assistant. The user asked:
+
+"{request}"
+
+{self._schema()}
+
+So far, these are the subquestions completed:
+{context if context else "None yet."}
+
+{next_instruction}
+If no more are needed, return: {DONE_MARKER}
+"""
+
+    def plan_next(self, request: str, steps: list, render=None) -> dict:
+        """
+        Ask the LLM for the next sub-question(s). Returns {"prompt", "response", "done",
+        "reasoning", "batch", "error"}: `batch` is a list of {"subquestion", "sql"} dicts,
+        `error` is set when the response could not be parsed.
+        """
+        render = render or _join_tokens
+        with self.stage("plan"):
+            prompt = self.build_plan_prompt(request, steps)
+            response = render(self.vn.submit_prompt_stream([
+                self.vn.system_message("You are a careful, step-by-step business analyst."),
+                self.vn.user_message(prompt)
+            ]))
+        response = response if isinstance(response, str) else ""
+        plan = {"prompt": prompt, "response": response, "done": False, "reasoning": None, "batch": [], "error": None}
+
+        # Check if done
+        if DONE_MARKER in response.strip().upper():
+            plan["done"] = True
+            plan["reasoning"] = self._done_reasoning(response)
+            return plan
+
+        # Parse response: one step, or a batch of independent steps
+        try:
+            if self.plan_mode == "batch" and '[' in response:
+                batch = json.loads(response[response.find('['):response.rfind(']')+1])
+                batch = [item for item in batch if isinstance(item, dict)][:self.plan_batch_size]
+            else:
+                batch = [json.loads(response[response.find('{'):response.rfind('}')+1])]
+            if not batch:
+                raise ValueError("no subquestions in response")
+            plan["batch"] = batch[:max(self.max_steps - len(steps), 1)]
+        except Exception as e:
+            plan["error"] = str(e)
+        return plan
+
+    @staticmethod
+    def _done_reasoning(response: str) -> str | None:
+        reasoning = None
+        # Try to extract a reason field if present
+        if 'reason' in response.lower():
+            try:
+                resp_json = json.loads(response[response.find('{'):response.rfind('}')+1])
+                reasoning = resp_json.get('reason')
+            except Exception:
+                pass
+        if not reasoning:
+            # Fallback: try to extract any text after 'DONE' as reasoning
+            done_idx = response.upper().find('DONE')
+            after_done = response[done_idx+4:].strip()
+            if after_done:
+                reasoning = after_done
+        return reasoning
+
+    # --- Execution ---
+
+    def execute(self, batch: list) -> list:
+        """
+        Run the SQL of a planned batch (independent queries run concurrently). Successful steps
+        get 'full_df', 'result' (5-row preview) and 'truncated'; returns the DataFrame or
+        Exception of each step, in order.
+        """
+        if self.db_adapter is None:
+            raise ValueError("Database adapter not initialized.")
+        with self.stage("sql"):
+            results = self.db_adapter.run_many(
+                [step_data['sql'] for step_data in batch], max_rows=self.max_rows, max_bytes=self.max_bytes
+            )
+        for step_data, df in zip(batch, results):
+            if isinstance(df, Exception):
+                continue
+            df['__source__'] = step_data['subquestion']
+            step_data['truncated'] = df.attrs.get("truncated", False)
+            step_data['result'] = df.head(5).to_dict(orient='records')  # limit preview
+            step_data['full_df'] = df  # keep full data for report
+        return results
+
+    @staticmethod
+    def combine(steps: list) -> pd.DataFrame:
+        all_dfs = [c['full_df'] for c in steps if 'full_df' in c]
+        combined_df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
+        combined_df.attrs["truncated"] = any(c.get('truncated') for c in steps)
+        return combined_df
+
+    # --- Report ---
+
+    def summarize(self, steps: list, combined_df: pd.DataFrame) -> str | None:
+        """Database-side statistics when the profile mode asks for them; None means summarize the DataFrame"""
+        if not (self.profile_mode == "sql" or (self.profile_mode == "auto" and combined_df.attrs.get("truncated"))):
+            return None
+        with self.stage("summarize"):
+            try:
+                return "\n\n".join(
+                    f"### {c['subquestion']}\n" + summarize_sql(self.db_adapter, c['sql'])
+                    for c in steps if 'full_df' in c
+                )
+            except Exception as e:
+                print(f"Error summarizing in the database, falling back to pandas: {e}")
+                return None
+
+    def write_report(self, request: str, steps: list, combined_df: pd.DataFrame, data_summary: str | None = None,
+                     render=None) -> str:
+        render = render or _join_tokens
+        with self.stage("report"):
+            report = render(generate_report_stream(
+                question=request,
+                sql="\n".join([c['sql'] for c in steps]),
+                data_frame=combined_df,
+                llm_api_url=self.vn.base_url,
+                api_key=self.api_key,
+                data_summary=data_summary
+            ))
+        return remove_think_blocks(report if isinstance(report, str) else "")
+
+    # --- Slides ---
+
+    @staticmethod
+    def slides_metadata(combined_df: pd.DataFrame, steps: list) -> str:
+        # Create comprehensive metadata with column info
+        columns_info = []
+        for col in combined_df.columns:
+            col_type = str(combined_df[col].dtype)
+            unique_count = combined_df[col].nunique()
+            columns_info.append(f"{col} ({col_type}, {unique_count} unique values)")
+
+        columns_str = '; '.join(columns_info)
+        if steps:
+            subquestions_str = '; '.join(item['subquestion'] for item in steps)
+            return f"Dataset columns: {columns_str}. Analysis subquestions: {subquestions_str}"
+        return f"Dataset columns: {columns_str}"
+
+    def plan_slides(self, report: str, combined_df: pd.DataFrame, steps: list) -> list:
+        with self.stage("slides_plan"):
+            slides = ask_llm_for_slides(
+                report_text=report,
+                metadata=self.slides_metadata(combined_df, steps),
+                api_key=self.api_key,
+                base_url=self.vn.base_url
+            )
+        return deduplicate_charts(slides) if slides else []
+
+    def render_slides(self, slides: list, combined_df: pd.DataFrame, steps: list) -> str:
+        with self.stage("slides_render"):
+            # Charts are aggregated by the database from the step queries
+            chart_sources = [
+                {"sql": item['sql'], "columns": list(item['full_df'].columns), "name": item['subquestion']}
+                for item in steps if 'full_df' in item
+            ]
+            return generate_reveal_html(
+                slides_json=slides,
+                df=combined_df,  # fallback when a chart can't be pushed down
+                return_html=True,
+                sources=chart_sources,
+                db_adapter=self.db_adapter
+            )
+
+    # --- Headless run ---
+
+    @tracing.traced("pipeline.run")
+    def run(self, request: str, with_slides: bool = True, log=print) -> dict:
+        """
+        Run every stage for `request`. Returns {"steps", "report", "slides", "html",
+        "combined_df", "timings"}; failed queries end planning like in the app.
+        """
+        self.timings = []
+        steps = []
+        while len(steps) < self.max_steps:
+            plan = self.plan_next(request, steps)
+            if plan["done"]:
+                log(f"✅ Planning finished after {len(steps)} steps.")
+                break
+            if plan["error"]:
+                log(f"❌ Failed to parse response at step {len(steps) + 1}: {plan['error']}")
+                break
+            results = self.execute(plan["batch"])
+            failed = False
+            for step_data, df in zip(plan["batch"], results):
+                if isinstance(df, Exception):
+                    log(f"❌ Query {len(steps) + 1} failed: {df}")
+                    failed = True
+                    break
+                steps.append(step_data)
+                log(f"🔍 Step {len(steps)}: {step_data['subquestion']} ({len(df)} rows)")
+            if failed:
+                break
+
+        combined_df = self.combine(steps)
+        data_summary = self.summarize(steps, combined_df)
+        report = self.write_report(request, steps, combined_df, data_summary)
+
+        slides, html = [], None
+        if with_slides and report and not combined_df.empty:
+            slides = self.plan_slides(report, combined_df, steps)
+            if slides:
+                html = self.render_slides(slides, combined_df, steps)
+
+        tracing.current_span().set(steps=len(steps), slides=len(slides))
+        return {
+            "steps": steps,
+            "report": report,
+            "slides": slides,
+            "html": html,
+            "combined_df": combined_df,
+            "timings": list(self.timings),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a report and Reveal.js slides for a request against a database.")
+    parser.add_argument("--db-url", required=True, help="SQLAlchemy URL, e.g. sqlite:///db/mydb.db")
+    parser.add_argument("--request", required=True, help="High-level report request")
+    parser.add_argument("--out", default="output", help="Output directory (default: output)")
+    parser.add_argument("--plan-mode", choices=["sequential", "batch"], default=PLAN_MODE)
+    parser.add_argument("--max-steps", type=int, default=MAX_PLAN_STEPS)
+    parser.add_argument("--no-slides", action="store_true", help="Only write the report")
+    args = parser.parse_args(argv)
+
+    from config.config import vn
+
+    # Training data is loaded when the agent is built (config/config.py)
+    db_adapter = DBAdapter(args.db_url, dtype_backend=RESULT_DTYPE_BACKEND)
+
+    pipeline = ReportPipeline(vn, db_adapter, plan_mode=args.plan_mode, max_steps=args.max_steps)
+    result = pipeline.run(args.request, with_slides=not args.no_slides)
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, "report.md"), "w", encoding="utf-8") as f:
+        f.write(result["report"])
+    if result["html"]:
+        with open(os.path.join(args.out, "slides.html"), "w", encoding="utf-8") as f:
+            f.write(result["html"])
+    with open(os.path.join(args.out, "run.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "request": args.request,
+            "db_url": make_url(args.db_url).render_as_string(hide_password=True),
+            "steps": [
+                {"subquestion": s["subquestion"], "sql": s["sql"], "rows": len(s["full_df"]), "truncated": s.get("truncated", False)}
+                for s in result["steps"]
+            ],
+            "timings": result["timings"],
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"\n📁 Output written to {args.out}")
+    print("⏱️ Stage timings:")
+    for name, seconds in pipeline.stage_totals().items():
+        print(f"  - {name}: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
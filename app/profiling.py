@@ -0,0 +1,197 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Frames with more rows than this are profiled approximately (0 disables approximate mode)
+APPROX_ROWS = int(os.getenv("PROFILE_APPROX_ROWS", 5_000_000))
+SAMPLE_SIZE = int(os.getenv("PROFILE_SAMPLE_SIZE", 200_000))
+HLL_PRECISION = 14  # 2^14 registers, ~0.8% standard error
+# In approximate mode, text columns whose sample has more distinct values than this share use sketches
+HIGH_CARDINALITY_RATIO = 0.05
+
+
+def profile_dataframe(df: pd.DataFrame, approx_rows: int | None = None, sample_size: int | None = None,
+                      seed: int = 0) -> dict:
+    """
+    Per-column statistics for summarize_dataframe, one vectorized pass per column.
+
+    Numeric columns are converted to a float64 NumPy array once; nulls and moments
+    (mean/std/skew) come from that array, and a single sort of it gives the distinct
+    count, min/max, quartiles and the IQR outliers without per-column masks over the
+    frame or outlier sub-frames. Text columns get nulls, distinct count and top values
+    from a single value_counts.
+
+    Frames larger than `approx_rows` switch high-cardinality text columns to sketch
+    mode: the distinct count comes from a HyperLogLog sketch and top values from a
+    `sample_size`-row sample, instead of hashing every string into one big table.
+    Every other statistic stays exact; those column stats carry "exact": True.
+    """
+    approx_rows = APPROX_ROWS if approx_rows is None else approx_rows
+    sample_size = SAMPLE_SIZE if sample_size is None else sample_size
+    n_rows = len(df)
+    approximate = bool(approx_rows) and n_rows > approx_rows and n_rows > sample_size
+    sample_idx = None
+    if approximate:
+        sample_idx = np.random.default_rng(seed).choice(n_rows, size=sample_size, replace=False)
+
+    numeric_cols = list(df.select_dtypes(include=["number"]).columns)
+    object_cols = list(df.select_dtypes(include=["object", "string"]).columns)
+    datetime_cols = list(df.select_dtypes(include=["datetime", "datetime64[ns]"]).columns)
+
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if col in numeric_cols:
+            columns[col] = _profile_numeric(series)
+        elif col in object_cols:
+            columns[col] = _profile_text(series, approximate, sample_idx)
+        else:
+            # datetime/bool/category: hashing fixed-width values is cheap, keep these exact
+            columns[col] = {"nulls": int(series.isna().sum()), "unique": int(series.nunique()), "exact": True}
+        columns[col]["dtype"] = series.dtype
+    for col in datetime_cols:
+        columns[col]["min"] = df[col].min()
+        columns[col]["max"] = df[col].max()
+
+    return {
+        "rows": n_rows,
+        "approximate": approximate,
+        "sample_size": sample_size if approximate else None,
+        "columns": columns,
+        "numeric_cols": numeric_cols,
+        "object_cols": object_cols,
+        "datetime_cols": datetime_cols,
+    }
+
+
+def _profile_numeric(series: pd.Series) -> dict:
+    values = series.to_numpy(dtype="float64", na_value=np.nan)
+    valid_mask = ~np.isnan(values)
+    valid = values[valid_mask]
+    n = len(valid)
+    stats = {"nulls": len(values) - n, "count": n, "exact": True}
+    nan = float("nan")
+    if n == 0:
+        stats.update(unique=0, mean=nan, std=nan, min=nan, max=nan, skew=nan,
+                     q1=nan, q3=nan, outliers=0, top_outliers=[])
+        return stats
+
+    mean = valid.sum() / n
+    centered = valid - mean
+    squared = centered * centered
+    m2 = squared.sum()
+    m3 = (squared * centered).sum()
+    del centered, squared
+    stats["mean"] = float(mean)
+    stats["std"] = float(np.sqrt(m2 / (n - 1))) if n > 1 else nan
+    # Same bias-adjusted estimator (and float-noise cutoff) as pandas' skew()
+    m2 = 0.0 if abs(m2) < 1e-14 else m2
+    m3 = 0.0 if abs(m3) < 1e-14 else m3
+    if n < 3:
+        stats["skew"] = nan
+    elif m2 == 0:
+        stats["skew"] = 0.0
+    else:
+        stats["skew"] = float(n * (n - 1) ** 0.5 / (n - 2) * (m3 / m2 ** 1.5))
+
+    # One sort gives distinct count, min/max, quartiles and both outlier tails
+    # (NumPy's sort beats hashing here, so numeric columns are always exact)
+    ordered = np.sort(valid)
+    stats["unique"] = int(np.count_nonzero(ordered[1:] != ordered[:-1])) + 1
+    stats["min"] = float(ordered[0])
+    stats["max"] = float(ordered[-1])
+    q1, q3 = _sorted_quantiles(ordered)
+    iqr = q3 - q1
+    lower, upper = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    n_low = int(np.searchsorted(ordered, lower, side="left"))
+    high_start = int(np.searchsorted(ordered, upper, side="right"))
+    count = n_low + n - high_start
+    top = np.concatenate([ordered[max(0, n_low - 3):n_low], ordered[high_start:][-3:]])[-3:]
+
+    stats["q1"], stats["q3"] = float(q1), float(q3)
+    stats["outliers"] = count
+    top = top[::-1]
+    if series.dtype.kind in "iu":
+        stats["top_outliers"] = [int(v) for v in top]
+    else:
+        stats["top_outliers"] = [round(float(v), 2) for v in top]
+    return stats
+
+
+def _sorted_quantiles(ordered: np.ndarray, quantiles=(0.25, 0.75)) -> list:
+    """Linear-interpolated quantiles of an already sorted array (same results as np.quantile)"""
+    n = len(ordered)
+    result = []
+    for q in quantiles:
+        # Linear interpolation between the closest ranks (numpy's default "linear" method)
+        position = (n - 1) * q
+        below = min(int(np.floor(position)), n - 1)
+        above = min(below + 1, n - 1)
+        t = position - below
+        a, b = ordered[below], ordered[above]
+        diff = b - a
+        result.append(b - diff * (1 - t) if t >= 0.5 else a + diff * t)
+    return result
+
+
+def _profile_text(series: pd.Series, approximate: bool, sample_idx) -> dict:
+    if approximate:
+        sampled = series.iloc[sample_idx].value_counts()
+        # Low-cardinality columns (the usual categories) are cheap to count exactly
+        if len(sampled) > HIGH_CARDINALITY_RATIO * len(sample_idx):
+            values = series.to_numpy()
+            valid = values[~pd.isna(values)]
+            scale = len(valid) / max(int(sampled.sum()), 1)
+            # Values seen once in the sample say nothing about their frequency
+            top = [(val, int(round(count * scale))) for val, count in sampled.head(3).items() if count > 1]
+            return {"nulls": len(series) - len(valid), "unique": _hll_count(valid), "top_values": top}
+    # value_counts gives distinct count, null count and top values from one hash pass
+    vc = series.value_counts()
+    return {
+        "nulls": len(series) - int(vc.sum()),
+        "unique": len(vc),
+        "top_values": list(vc.head(3).items()),
+        "exact": True,
+    }
+
+
+def _hll_count(values, precision: int = HLL_PRECISION) -> int:
+    """Approximate distinct count of `values` with a HyperLogLog sketch over 64-bit hashes"""
+    if len(values) == 0:
+        return 0
+    m = 1 << precision
+    values = np.asarray(values)
+    if values.dtype == object:
+        # Python caches str hashes, which makes this far cheaper than hash_array's re-encoding
+        hashes = _mix64(np.fromiter(map(hash, values), dtype=np.int64, count=len(values)).view(np.uint64))
+    else:
+        hashes = pd.util.hash_array(values)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # Remaining bits, with a sentinel below them (bit 11, precision > 11) so the leading-zero count is bounded
+    rest = (hashes << np.uint64(precision)) | np.uint64(1 << 11)
+    rank = _leading_zeros(rest) + 1
+    registers = np.zeros(m, dtype=np.uint8)
+    np.maximum.at(registers, index, rank.astype(np.uint8))
+
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+    return int(round(estimate))
+
+
+def _leading_zeros(x: np.ndarray) -> np.ndarray:
+    # The top 53 bits convert to float64 exactly, so frexp's exponent is their bit length;
+    # the caller's sentinel bit keeps them non-zero
+    _, exponent = np.frexp((x >> np.uint64(11)).astype(np.float64))
+    return 64 - (exponent.astype(np.int64) + 11)
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads weak hashes (e.g. hash(int) == int) over all 64 bits"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
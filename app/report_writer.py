@@ -1,87 +1,325 @@
+import math
 import requests
 import pandas as pd
 import re
 from io import StringIO
+from app.profiling import profile_dataframe
+from core import tracing
+from core.llm_client import get_llm_client
 
 def remove_think_blocks(text):
     """Remove <think>...</think> blocks if present in LLM response."""
     return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
 
 
-def summarize_dataframe(df: pd.DataFrame) -> str:
-    """Deep summary and quality check for DataFrame."""
+def remove_think_blocks_stream(tokens):
+    """Streaming version of remove_think_blocks: drops <think>...</think> spans that may be split across tokens."""
+    open_tag, close_tag = "<think>", "</think>"
+    buffer = ""
+    in_think = False
+    started = False
+    for token in tokens:
+        buffer += token
+        while True:
+            if in_think:
+                idx = buffer.find(close_tag)
+                if idx == -1:
+                    # Keep a tail that may hold the start of the closing tag
+                    buffer = buffer[-(len(close_tag) - 1):]
+                    break
+                buffer = buffer[idx + len(close_tag):]
+                in_think = False
+            else:
+                idx = buffer.find(open_tag)
+                if idx != -1:
+                    text, buffer = buffer[:idx], buffer[idx + len(open_tag):]
+                    in_think = True
+                else:
+                    cut = max(0, len(buffer) - (len(open_tag) - 1))
+                    text, buffer = buffer[:cut], buffer[cut:]
+                if not started:
+                    text = text.lstrip()
+                if text:
+                    started = True
+                    yield text
+                if idx == -1:
+                    break
+    if not in_think:
+        text = buffer if started else buffer.lstrip()
+        if text.rstrip():
+            yield text.rstrip()
+
+
+@tracing.traced("summarize", method="pandas")
+def summarize_dataframe(df: pd.DataFrame, approx_rows: int | None = None) -> str:
+    """
+    Deep summary and quality check for DataFrame.
+    Statistics come from profile_dataframe; frames above `approx_rows` rows are profiled approximately.
+    """
+    profile = profile_dataframe(df, approx_rows=approx_rows)
+    columns = profile["columns"]
+    tracing.current_span().set(input_rows=len(df), columns=len(df.columns), approximate=profile["approximate"])
+
+    def approx(stats):
+        return "~" if profile["approximate"] and not stats.get("exact") else ""
 
     lines = []
-    lines.append(f"🔹 Dataset: {len(df)} rows × {len(df.columns)} columns")
+    lines.append(f"🔹 Dataset: {profile['rows']} rows × {len(df.columns)} columns")
+    if df.attrs.get("truncated"):
+        lines.append("⚠️ The query result was truncated at the row/size limit; statistics cover the fetched rows only.")
+    if profile["approximate"]:
+        lines.append(
+            f"(approximate where marked ~: distinct counts via HyperLogLog, top values from a {profile['sample_size']}-row sample)"
+        )
 
     # 1. Column overview
     lines.append("\n🔸 Column Overview:")
     for col in df.columns:
-        dtype = df[col].dtype
-        null_count = df[col].isnull().sum()
-        unique_count = df[col].nunique()
-        lines.append(f"  - {col} ({dtype}) | nulls: {null_count}, unique: {unique_count}")
+        stats = columns[col]
+        lines.append(f"  - {col} ({stats['dtype']}) | nulls: {stats['nulls']}, unique: {approx(stats)}{stats['unique']}")
 
     # 2. Numeric columns
-    numeric_cols = df.select_dtypes(include=["number"]).columns
+    numeric_cols = profile["numeric_cols"]
     if len(numeric_cols) > 0:
         lines.append("\n📊 Numeric Summary:")
-        desc = df[numeric_cols].describe().T
-        desc["skew"] = df[numeric_cols].skew()
-        for col in desc.index:
-            row = desc.loc[col]
+        for col in numeric_cols:
+            stats = columns[col]
             lines.append(
-                f"  - {col}: mean={row['mean']:.2f}, std={row['std']:.2f}, min={row['min']}, max={row['max']}, skew={row['skew']:.2f}"
+                f"  - {col}: mean={stats['mean']:.2f}, std={stats['std']:.2f}, min={stats['min']}, max={stats['max']}, skew={stats['skew']:.2f}"
             )
 
     lines.append("\n⚠️ Potential Outliers (IQR Method):")
     for col in numeric_cols:
-        q1 = df[col].quantile(0.25)
-        q3 = df[col].quantile(0.75)
-        iqr = q3 - q1
-        lower = q1 - 1.5 * iqr
-        upper = q3 + 1.5 * iqr
+        stats = columns[col]
+        if stats["outliers"]:
+            lines.append(
+                f"  - {col}: {stats['outliers']} outliers | IQR=({stats['q1']:.2f}, {stats['q3']:.2f}) | Top values: {stats['top_outliers']}"
+            )
+        else:
+            lines.append(
+                f"  - {col}: No outliers detected | IQR=({stats['q1']:.2f}, {stats['q3']:.2f})"
+            )
+
+
+    # 4. Object columns (categorical/text)
+    for col in profile["object_cols"]:
+        lines.append(f"\n🔠 Top values in '{col}':")
+        for val, count in columns[col]["top_values"]:
+            lines.append(f"  - {val}: {approx(columns[col])}{count} rows")
+
+    # 5. Datetime columns if any
+    for col in profile["datetime_cols"]:
+        lines.append(f"\n🗓️ Datetime column: {col}")
+        lines.append(f"  - Range: {columns[col]['min']} → {columns[col]['max']}")
+
+    return "\n".join(lines)
+
+
+@tracing.traced("summarize", method="sql")
+def summarize_sql(db_adapter, sql: str, sample_rows: int = 1000) -> str:
+    """
+    Same summary as summarize_dataframe, computed inside the database: the query is wrapped as a
+    subquery and profiled with aggregate queries (COUNT/COUNT DISTINCT, MIN/MAX, moments,
+    NTILE quartiles or percentile_cont on PostgreSQL, GROUP BY top values), so only the
+    summary crosses the wire. Column types are inferred from a small sample.
+    """
+    base = sql.strip().rstrip(";")
+    dialect = db_adapter.get_engine().dialect
+    quote = dialect.identifier_preparer.quote
+
+    def run(query):
+        return db_adapter.run_sql(query)
+
+    sample = run(f"SELECT * FROM ({base}) AS _q LIMIT {int(sample_rows)}")
+    columns = list(sample.columns)
+    numeric_cols = list(sample.select_dtypes(include=["number"]).columns)
+    object_cols = list(sample.select_dtypes(include=["object", "string"]).columns)
+    datetime_cols = list(sample.select_dtypes(include=["datetime", "datetime64[ns]"]).columns)
+    q = {col: quote(col) for col in columns}
+
+    # 1. Counts, distincts, moments and ranges in one pass
+    selects = ["COUNT(*) AS n_rows"]
+    for i, col in enumerate(columns):
+        selects.append(f"COUNT({q[col]}) AS nn_{i}")
+        selects.append(f"COUNT(DISTINCT {q[col]}) AS nd_{i}")
+        if col in numeric_cols:
+            x = f"({q[col]} * 1.0)"
+            selects += [f"AVG({x}) AS m1_{i}", f"AVG({x} * {x}) AS m2_{i}", f"AVG({x} * {x} * {x}) AS m3_{i}"]
+        if col in numeric_cols or col in datetime_cols:
+            selects += [f"MIN({q[col]}) AS min_{i}", f"MAX({q[col]}) AS max_{i}"]
+    overview = run(f"SELECT {', '.join(selects)} FROM ({base}) AS _q").iloc[0]
+    n_rows = int(overview["n_rows"])
+
+    lines = []
+    lines.append(f"🔹 Dataset: {n_rows} rows × {len(columns)} columns")
+    lines.append("(statistics computed in the database; quartiles are approximate)")
 
-        outliers = df[(df[col] < lower) | (df[col] > upper)]
+    lines.append("\n🔸 Column Overview:")
+    for i, col in enumerate(columns):
+        null_count = n_rows - int(overview[f"nn_{i}"])
+        lines.append(f"  - {col} ({sample[col].dtype}) | nulls: {null_count}, unique: {int(overview[f'nd_{i}'])}")
 
-        if not outliers.empty:
-            # Get top 3 outlier values
-            top_outlier_vals = outliers[col].nlargest(3).round(2).tolist()
+    # 2. Numeric columns
+    quartiles = _sql_quartiles(run, base, numeric_cols, q, dialect.name) if numeric_cols else {}
+    if numeric_cols:
+        lines.append("\n📊 Numeric Summary:")
+        for col in numeric_cols:
+            i = columns.index(col)
+            n = int(overview[f"nn_{i}"])
+            mean, std, skew = _moments_to_stats(n, overview[f"m1_{i}"], overview[f"m2_{i}"], overview[f"m3_{i}"])
+            lines.append(
+                f"  - {col}: mean={mean:.2f}, std={std:.2f}, min={_as_float(overview[f'min_{i}'])}, max={_as_float(overview[f'max_{i}'])}, skew={skew:.2f}"
+            )
 
+    lines.append("\n⚠️ Potential Outliers (IQR Method):")
+    bounds = {}
+    for col in numeric_cols:
+        q1, q3 = quartiles.get(col, (float("nan"), float("nan")))
+        iqr = q3 - q1
+        bounds[col] = (q1, q3, q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+    outlier_counts = {}
+    valid = [col for col in numeric_cols if not math.isnan(bounds[col][0])]
+    if valid:
+        counts = run("SELECT " + ", ".join(
+            f"SUM(CASE WHEN {q[col]} < {bounds[col][2]!r} OR {q[col]} > {bounds[col][3]!r} THEN 1 ELSE 0 END) AS o_{j}"
+            for j, col in enumerate(valid)
+        ) + f" FROM ({base}) AS _q").iloc[0]
+        outlier_counts = {col: int(counts[f"o_{j}"] or 0) for j, col in enumerate(valid)}
+    for col in numeric_cols:
+        q1, q3, lower, upper = bounds[col]
+        count = outlier_counts.get(col, 0)
+        if count:
+            top = run(
+                f"SELECT {q[col]} AS v FROM ({base}) AS _q WHERE {q[col]} < {lower!r} OR {q[col]} > {upper!r} "
+                f"ORDER BY {q[col]} DESC LIMIT 3"
+            )
+            top_outlier_vals = [round(float(v), 2) for v in top["v"].tolist()]
             lines.append(
-                f"  - {col}: {len(outliers)} outliers | IQR=({q1:.2f}, {q3:.2f}) | Top values: {top_outlier_vals}"
+                f"  - {col}: {count} outliers | IQR=({q1:.2f}, {q3:.2f}) | Top values: {top_outlier_vals}"
             )
         else:
             lines.append(
                 f"  - {col}: No outliers detected | IQR=({q1:.2f}, {q3:.2f})"
             )
 
-
     # 4. Object columns (categorical/text)
-    object_cols = df.select_dtypes(include=["object"]).columns
     for col in object_cols:
-        vc = df[col].value_counts().head(3)
+        vc = run(
+            f"SELECT {q[col]} AS value, COUNT(*) AS cnt FROM ({base}) AS _q WHERE {q[col]} IS NOT NULL "
+            f"GROUP BY {q[col]} ORDER BY cnt DESC LIMIT 3"
+        )
         lines.append(f"\n🔠 Top values in '{col}':")
-        for val, count in vc.items():
+        for val, count in zip(vc["value"].tolist(), vc["cnt"].tolist()):
             lines.append(f"  - {val}: {count} rows")
 
     # 5. Datetime columns if any
-    datetime_cols = df.select_dtypes(include=["datetime", "datetime64[ns]"]).columns
     for col in datetime_cols:
+        i = columns.index(col)
         lines.append(f"\n🗓️ Datetime column: {col}")
-        lines.append(f"  - Range: {df[col].min()} → {df[col].max()}")
+        lines.append(f"  - Range: {overview[f'min_{i}']} → {overview[f'max_{i}']}")
 
     return "\n".join(lines)
 
 
+def _sql_quartiles(run, base: str, numeric_cols: list, q: dict, dialect_name: str) -> dict:
+    """(q1, q3) per numeric column: exact percentile_cont on PostgreSQL, NTILE(4) bucket edges elsewhere"""
+    if dialect_name == "postgresql":
+        selects = []
+        for j, col in enumerate(numeric_cols):
+            selects.append(f"percentile_cont(0.25) WITHIN GROUP (ORDER BY {q[col]}) AS q1_{j}")
+            selects.append(f"percentile_cont(0.75) WITHIN GROUP (ORDER BY {q[col]}) AS q3_{j}")
+        row = run(f"SELECT {', '.join(selects)} FROM ({base}) AS _q").iloc[0]
+    else:
+        # NULLs get their own partition so they never land in a quartile bucket
+        windows, aggs = [], []
+        for j, col in enumerate(numeric_cols):
+            windows.append(
+                f"{q[col]} AS v_{j}, NTILE(4) OVER (PARTITION BY CASE WHEN {q[col]} IS NULL THEN 1 ELSE 0 END "
+                f"ORDER BY {q[col]}) AS t_{j}"
+            )
+            aggs.append(f"MAX(CASE WHEN t_{j} = 1 AND v_{j} IS NOT NULL THEN v_{j} END) AS q1_{j}")
+            aggs.append(f"MAX(CASE WHEN t_{j} = 3 AND v_{j} IS NOT NULL THEN v_{j} END) AS q3_{j}")
+        row = run(
+            f"SELECT {', '.join(aggs)} FROM (SELECT {', '.join(windows)} FROM ({base}) AS _q) AS _t"
+        ).iloc[0]
+    return {col: (_as_float(row[f"q1_{j}"]), _as_float(row[f"q3_{j}"])) for j, col in enumerate(numeric_cols)}
+
+
+def _moments_to_stats(n: int, m1, m2, m3):
+    """mean, sample std and adjusted skew (as pandas computes them) from raw moments E[x], E[x²], E[x³]"""
+    if n == 0:
+        return float("nan"), float("nan"), float("nan")
+    m1, m2, m3 = _as_float(m1), _as_float(m2), _as_float(m3)
+    var_pop = max(m2 - m1 * m1, 0.0)
+    std = math.sqrt(var_pop * n / (n - 1)) if n > 1 else float("nan")
+    if n > 2 and var_pop > 0:
+        central_m3 = m3 - 3 * m1 * m2 + 2 * m1 ** 3
+        skew = central_m3 / var_pop ** 1.5 * math.sqrt(n * (n - 1)) / (n - 2)
+    else:
+        skew = 0.0 if n > 2 else float("nan")
+    return m1, std, skew
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
 
-def generate_report(question: str, sql: str, data_frame: pd.DataFrame, llm_api_url: str, api_key: str | None = None) -> str:
+@tracing.traced("report.generate")
+def generate_report(question: str, sql: str, data_frame: pd.DataFrame, llm_api_url: str, api_key: str | None = None, cache=None,
+                    data_summary: str | None = None) -> str:
     """
     Generate report from user question, SQL query, and DataFrame returned from the query.
     Includes deep summary, outlier detection, skew analysis, nulls,... to help LLM analyze more accurately.
+    Identical requests are answered from `cache` (default: the shared completion cache).
+    Pass `data_summary` (e.g. from summarize_sql) to skip summarizing `data_frame` in pandas.
     """
+    messages = _build_report_messages(question, sql, data_frame, data_summary)
+
+    try:
+        raw_text = get_llm_client(llm_api_url, api_key).chat(
+            messages,
+            model="gpt-4o-mini",
+            timeout=200,
+            cache=cache,
+            temperature=0.1
+        )
+        return remove_think_blocks(raw_text)
+
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"❌ Connection error: {e}")
+    except Exception as e:
+        raise RuntimeError(f"❌ Unexpected error: {e}")
+
+
+def generate_report_stream(question: str, sql: str, data_frame: pd.DataFrame, llm_api_url: str, api_key: str | None = None, cache=None,
+                           data_summary: str | None = None):
+    """Streaming version of generate_report: yields report text as the LLM produces it."""
+    messages = _build_report_messages(question, sql, data_frame, data_summary)
+
+    try:
+        tokens = get_llm_client(llm_api_url, api_key).stream_chat(
+            messages,
+            model="gpt-4o-mini",
+            timeout=200,
+            cache=cache,
+            temperature=0.1
+        )
+        yield from remove_think_blocks_stream(tokens)
+
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"❌ Connection error: {e}")
+    except Exception as e:
+        raise RuntimeError(f"❌ Unexpected error: {e}")
+
+
+def _build_report_messages(question: str, sql: str, data_frame: pd.DataFrame, data_summary: str | None = None) -> list:
     # Detailed summary
-    data_summary = summarize_dataframe(data_frame)
+    if data_summary is None:
+        data_summary = summarize_dataframe(data_frame)
     # Advanced prompt suggestions for LLM
     content = f"""
 User Question:
@@ -107,53 +345,7 @@ Write an analytical report that helps a data consumer understand the insight beh
 ✍️ Please generate a concise and data-grounded report:
 """
 
-    headers = {
-        "Content-Type": "application/json",
-    }
-    
-    # Add Authorization header if api_key is provided
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
-
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": [
-            {"role": "system", "content": "You are a careful, detail-driven data analyst."},
-            {"role": "user", "content": content}
-        ],
-        "temperature": 0.1
-    }
-
-    try:
-        response = requests.post(
-            f"{llm_api_url}/chat/completions",
-            headers=headers,
-            json=payload,
-            timeout=200
-        )
-        
-        # Check response status
-        if response.status_code != 200:
-            raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
-        
-        # Check if response has content
-        if not response.text.strip():
-            raise RuntimeError("Empty response from API")
-        
-        result = response.json()
-
-        if "choices" in result and result["choices"]:
-            raw_text = result["choices"][0]["message"]["content"]
-            clean_text = remove_think_blocks(raw_text)
-            return clean_text
-
-        elif "error" in result:
-            raise RuntimeError(f"LLM API Error: {result['error']}")
-
-        else:
-            raise RuntimeError(f"Invalid LLM response: {result}")
-
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError(f"❌ Connection error: {e}")
-    except Exception as e:
-        raise RuntimeError(f"❌ Unexpected error: {e}")
+    return [
+        {"role": "system", "content": "You are a careful, detail-driven data analyst."},
+        {"role": "user", "content": content}
+    ]
@@ -1,7 +1,28 @@
 import os
 import json
-from jinja2 import Environment, FileSystemLoader
+import hashlib
+import threading
+from collections import OrderedDict
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+import numpy as np
 import pandas as pd
+from core import tracing
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join(PROJECT_DIR, "templates")
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(PROJECT_DIR, ".cache", "jinja"))
+# Dev mode re-checks templates on disk for edits and disables the render cache
+TEMPLATE_DEV_MODE = os.getenv("TEMPLATE_DEV_MODE", "0").lower() in ("1", "true", "on", "yes")
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", 32))
+
+_template_env = None
+_render_cache = OrderedDict()  # hash of template name + context -> rendered HTML
+_template_lock = threading.Lock()
+
+# Point budgets for chart payloads (they are inlined as JSON into the Reveal HTML)
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", 12))
+CHART_HISTOGRAM_BINS = int(os.getenv("CHART_HISTOGRAM_BINS", 20))
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 500))
 
 
 def format_slide_content(content):
@@ -16,7 +37,7 @@ def format_slide_content(content):
 
 
 def generate_chart_data(df, chart_column, chart_value, chart_type):
-    """Generate Chart.js compatible data from DataFrame"""
+    """Generate Chart.js compatible data from DataFrame, bounded by the CHART_* point budgets"""
     if chart_column not in df.columns or (chart_value and chart_value not in df.columns):
         return None
     
@@ -24,36 +45,47 @@ def generate_chart_data(df, chart_column, chart_value, chart_type):
         if chart_type == "bar" and chart_value:
             # Group by chart_column and sum chart_value
             chart_data = df.groupby(chart_column)[chart_value].sum().sort_values(ascending=False)
+            labels, data = top_n_with_other(chart_data.index.tolist(), chart_data.values.tolist(), CHART_MAX_CATEGORIES)
             return {
-                "labels": chart_data.index.tolist(),
-                "data": chart_data.values.tolist(),
+                "labels": labels,
+                "data": data,
                 "label": f"{chart_value} by {chart_column}"
             }
         
         elif chart_type == "pie" and chart_value:
             # Group by chart_column and sum chart_value
             chart_data = df.groupby(chart_column)[chart_value].sum()
+            labels, data = top_n_with_other(chart_data.index.tolist(), chart_data.values.tolist(), CHART_MAX_CATEGORIES)
             return {
-                "labels": chart_data.index.tolist(),
-                "data": chart_data.values.tolist(),
+                "labels": labels,
+                "data": data,
                 "label": f"{chart_value} by {chart_column}"
             }
         
         elif chart_type == "line" and chart_value:
             # Group by chart_column and sum chart_value, sort by index
             chart_data = df.groupby(chart_column)[chart_value].sum().sort_index()
+            labels, data = downsample_series(chart_data.index.tolist(), chart_data.values.tolist(), CHART_MAX_POINTS)
             return {
-                "labels": chart_data.index.tolist(),
-                "data": chart_data.values.tolist(),
+                "labels": labels,
+                "data": data,
                 "label": f"{chart_value} over {chart_column}"
             }
         
         elif chart_type == "histogram":
-            # Create histogram data
-            hist_data = df[chart_column].value_counts().sort_index()
+            # Numeric columns are binned; categorical ones keep the most frequent values
+            column = df[chart_column].dropna()
+            if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column) \
+                    and column.nunique() > CHART_HISTOGRAM_BINS:
+                counts, edges = np.histogram(column.to_numpy(dtype="float64"), bins=CHART_HISTOGRAM_BINS)
+                labels, data = bin_labels(edges), counts.tolist()
+            else:
+                hist_data = column.value_counts().sort_index()
+                labels, data = top_n_with_other(hist_data.index.tolist(), hist_data.values.tolist(),
+                                                CHART_MAX_CATEGORIES, keep_order=True)
             return {
-                "labels": hist_data.index.tolist(),
-                "data": hist_data.values.tolist(),
+                "labels": labels,
+                "data": data,
                 "label": f"Distribution of {chart_column}"
             }
         
@@ -65,8 +97,195 @@ def generate_chart_data(df, chart_column, chart_value, chart_type):
         return None
 
 
-def prepare_slides_data(slides_json, df):
-    """Prepare slides data with real chart data from DataFrame"""
+def top_n_with_other(labels, data, max_categories, keep_order=False):
+    """
+    Keep the `max_categories - 1` largest values and sum the rest into an "Other" bucket.
+    With `keep_order` the kept categories stay in their original order instead of by value.
+    """
+    if not max_categories or len(labels) <= max_categories:
+        return labels, data
+    ranked = sorted(range(len(data)), key=lambda i: data[i], reverse=True)
+    kept = ranked[:max_categories - 1]
+    if keep_order:
+        kept.sort()
+    other = sum(data[i] for i in ranked[max_categories - 1:])
+    return [labels[i] for i in kept] + ["Other"], [data[i] for i in kept] + [other]
+
+
+def downsample_series(labels, data, max_points):
+    """Reduce an ordered series to `max_points` points with LTTB, keeping its visual shape"""
+    if not max_points or len(labels) <= max_points:
+        return labels, data
+    indices = lttb_indices(_numeric_axis(labels), np.asarray(data, dtype="float64"), max_points)
+    return [labels[i] for i in indices], [data[i] for i in indices]
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of the `threshold` points that best preserve the curve"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    y = np.nan_to_num(y)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected.append(a)
+    selected.append(n - 1)
+    return selected
+
+
+def _numeric_axis(labels):
+    # Real spacing for numeric and date labels, evenly spaced positions otherwise
+    try:
+        return np.asarray(labels, dtype="float64")
+    except (TypeError, ValueError):
+        pass
+    try:
+        return pd.to_datetime(pd.Series(labels)).astype("int64").to_numpy(dtype="float64")
+    except (TypeError, ValueError):
+        return np.arange(len(labels), dtype="float64")
+
+
+def bin_labels(edges):
+    return [f"{lo:.4g} – {hi:.4g}" for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+def compile_chart_sql(sources, chart_column, chart_value, chart_type, quote=lambda name: f'"{name}"',
+                      histogram_range=None, dialect="sqlite"):
+    """
+    Compile a chart spec into one aggregate query over the queries that produced the data.
+
+    `sources` is a list of {"sql", "columns", "name"} dicts (one per analysis step). Steps
+    that have `chart_column` are combined with UNION ALL (a missing `chart_value` becomes
+    NULL, like the NaNs of the concatenated DataFrame); the special "__source__" column
+    is the step name. A histogram with `histogram_range=(low, high, bins)` counts rows per
+    equal-width bin instead of per value. Returns None if no source has the column.
+    """
+    combined = _combine_chart_sources(sources, chart_column, chart_value, quote)
+    if combined is None:
+        return None
+
+    if chart_type in ("bar", "pie", "line") and chart_value:
+        order = "value DESC" if chart_type == "bar" else "label"
+        return (
+            f"SELECT label, COALESCE(SUM(value), 0) AS value FROM ({combined}) AS _c "
+            f"WHERE label IS NOT NULL GROUP BY label ORDER BY {order}"
+        )
+    if chart_type == "histogram" and histogram_range:
+        low, high, bins = histogram_range
+        scaled = f"(label - {low!r}) * {bins} / {float(high - low)!r}"
+        # CAST truncates in SQLite; elsewhere it may round, so use FLOOR
+        bucket = f"CAST({scaled} AS INTEGER)" if dialect == "sqlite" else f"FLOOR({scaled})"
+        return (
+            f"SELECT CASE WHEN label >= {high!r} THEN {bins - 1} ELSE {bucket} END AS label, COUNT(*) AS value "
+            f"FROM ({combined}) AS _c WHERE label IS NOT NULL GROUP BY 1 ORDER BY 1"
+        )
+    if chart_type == "histogram":
+        return (
+            f"SELECT label, COUNT(*) AS value FROM ({combined}) AS _c "
+            f"WHERE label IS NOT NULL GROUP BY label ORDER BY label"
+        )
+    return None
+
+
+def _combine_chart_sources(sources, chart_column, chart_value, quote):
+    parts = []
+    for i, source in enumerate(sources):
+        columns = source.get("columns") or []
+        if chart_column == "__source__":
+            name = str(source.get("name", "")).replace("'", "''")
+            label_expr = f"'{name}'"
+        elif chart_column in columns:
+            label_expr = quote(chart_column)
+        else:
+            continue
+        value_expr = quote(chart_value) if chart_value in columns else "NULL"
+        sql = source["sql"].strip().rstrip(";")
+        parts.append(f"SELECT {label_expr} AS label, {value_expr} AS value FROM ({sql}) AS _s{i}")
+    if not parts:
+        return None
+    return " UNION ALL ".join(parts)
+
+
+def generate_chart_data_sql(db_adapter, sources, chart_column, chart_value, chart_type):
+    """
+    Chart.js data aggregated by the database (see compile_chart_sql), bounded by the same
+    CHART_* budgets as generate_chart_data; None if the spec can't be compiled.
+    """
+    engine = db_adapter.get_engine()
+    quote = engine.dialect.identifier_preparer.quote
+    histogram_range = None
+    if chart_type == "histogram":
+        combined = _combine_chart_sources(sources, chart_column, chart_value, quote)
+        if combined is None:
+            return None
+        stats = db_adapter.run_sql(
+            f"SELECT MIN(label) AS low, MAX(label) AS high, COUNT(DISTINCT label) AS distinct_count "
+            f"FROM ({combined}) AS _c WHERE label IS NOT NULL"
+        ).iloc[0]
+        low, high = stats["low"], stats["high"]
+        numeric = all(isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in (low, high))
+        if numeric and stats["distinct_count"] > CHART_HISTOGRAM_BINS:
+            histogram_range = (float(low), float(high), CHART_HISTOGRAM_BINS)
+
+    sql = compile_chart_sql(sources, chart_column, chart_value, chart_type, quote,
+                            histogram_range=histogram_range, dialect=engine.dialect.name)
+    if sql is None:
+        return None
+    result = db_adapter.run_sql(sql)
+    labels, data = _json_values(result["label"]), _json_values(result["value"])
+
+    if histogram_range:
+        low, high, bins = histogram_range
+        counts = [0] * bins
+        for bucket, count in zip(labels, data):
+            counts[min(max(int(bucket), 0), bins - 1)] += count
+        labels, data = bin_labels(np.linspace(low, high, bins + 1)), counts
+    elif chart_type == "histogram":
+        labels, data = top_n_with_other(labels, data, CHART_MAX_CATEGORIES, keep_order=True)
+    elif chart_type == "line":
+        labels, data = downsample_series(labels, data, CHART_MAX_POINTS)
+    else:
+        labels, data = top_n_with_other(labels, data, CHART_MAX_CATEGORIES)
+
+    if chart_type == "histogram":
+        label = f"Distribution of {chart_column}"
+    elif chart_type == "line":
+        label = f"{chart_value} over {chart_column}"
+    else:
+        label = f"{chart_value} by {chart_column}"
+    return {
+        "labels": labels,
+        "data": data,
+        "label": label
+    }
+
+
+def _json_values(series):
+    # Dates and decimals from the database are rendered as text for the template's tojson
+    return [v if v is None or isinstance(v, (str, int, float, bool)) else str(v) for v in series.tolist()]
+
+
+@tracing.traced("slides.charts")
+def prepare_slides_data(slides_json, df, sources=None, db_adapter=None):
+    """
+    Prepare slides data with real chart data.
+    With `sources` (the step queries) and `db_adapter`, charts are aggregated in the database;
+    otherwise, or if that fails, from the DataFrame.
+    """
     prepared_slides = []
     
     for slide in slides_json:
@@ -81,7 +300,14 @@ def prepare_slides_data(slides_json, df):
         chart_type = slide.get("chart_type")
         
         if chart_column and chart_value and chart_type:
-            chart_data = generate_chart_data(df, chart_column, chart_value, chart_type)
+            chart_data = None
+            if sources and db_adapter is not None:
+                try:
+                    chart_data = generate_chart_data_sql(db_adapter, sources, chart_column, chart_value, chart_type)
+                except Exception as e:
+                    print(f"❌ Error aggregating chart in the database, using DataFrame: {e}")
+            if chart_data is None and df is not None:
+                chart_data = generate_chart_data(df, chart_column, chart_value, chart_type)
             if chart_data:
                 prepared_slide.update({
                     "chart_column": chart_column,
@@ -105,20 +331,61 @@ def prepare_slides_data(slides_json, df):
         
         prepared_slides.append(prepared_slide)
     
+    tracing.current_span().set(slides=len(prepared_slides), charts=sum(1 for s in prepared_slides if s.get("chart_data")))
     return prepared_slides
 
 
-def generate_reveal_html(slides_json, df, output_path="output/report.html", return_html=False):
+def get_template_env():
+    """
+    Process-wide Jinja2 environment for the project's templates directory (independent of the
+    working directory). Compiled templates are kept in memory and in a bytecode cache on disk;
+    templates are only re-checked for changes in dev mode (TEMPLATE_DEV_MODE=1).
+    """
+    global _template_env
+    with _template_lock:
+        if _template_env is None:
+            os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+            _template_env = Environment(
+                loader=FileSystemLoader(TEMPLATES_DIR),
+                auto_reload=TEMPLATE_DEV_MODE,
+                bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+            )
+        return _template_env
+
+
+@tracing.traced("template.render")
+def render_template(name, **context):
+    """Render a template, reusing the output of an earlier render with the same context (outside dev mode)"""
+    template = get_template_env().get_template(name)
+    tracing.current_span().set(template=name)
+    if TEMPLATE_DEV_MODE or not RENDER_CACHE_SIZE:
+        return template.render(**context)
+    payload = json.dumps(context, sort_keys=True, default=str, ensure_ascii=False)
+    key = hashlib.sha256(f"{name}\0{payload}".encode("utf-8")).hexdigest()
+    with _template_lock:
+        html_content = _render_cache.get(key)
+        if html_content is not None:
+            _render_cache.move_to_end(key)
+            tracing.current_span().set(cache="hit", html_bytes=len(html_content))
+            return html_content
+    html_content = template.render(**context)
+    tracing.current_span().set(html_bytes=len(html_content))
+    with _template_lock:
+        _render_cache[key] = html_content
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return html_content
+
+
+@tracing.traced("slides.render")
+def generate_reveal_html(slides_json, df, output_path="output/report.html", return_html=False, sources=None, db_adapter=None):
     """Generate Reveal.js HTML with real chart data"""
     
     # Prepare slides data with real chart data
-    prepared_slides = prepare_slides_data(slides_json, df)
-    
-    # Render HTML using Jinja2
-    env = Environment(loader=FileSystemLoader("templates"))
-    template = env.get_template("reveal_template.html")
+    prepared_slides = prepare_slides_data(slides_json, df, sources=sources, db_adapter=db_adapter)
     
-    html_content = template.render(slides=prepared_slides)
+    # Render HTML using Jinja2 (identical slides are served from the render cache)
+    html_content = render_template("reveal_template.html", slides=prepared_slides)
 
     if return_html:
         return html_content
@@ -1,8 +1,9 @@
-import requests
 import re
 import os
 import json
 from dotenv import load_dotenv
+from core import tracing
+from core.llm_client import get_llm_client
 
 load_dotenv()
 
@@ -66,7 +67,8 @@ def deduplicate_charts(slides: list[dict]) -> list[dict]:
     return deduped_slides
 
 
-def ask_llm_for_slides(report_text, metadata, api_key=None, base_url=None):
+@tracing.traced("slides.plan")
+def ask_llm_for_slides(report_text, metadata, api_key=None, base_url=None, cache=None):
     if api_key is None:
         api_key = os.getenv("LLM_API_KEY")
     if base_url is None:
@@ -121,21 +123,17 @@ Return a valid JSON list:
 Return JSON only. Do not include explanations or markdown.
 """
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": "gpt-4",
-        "messages": [{"role": "user", "content": prompt}]
-    }
-
     try:
-        response = requests.post(f"{base_url}/chat/completions", headers=headers, json=data)
-        response.raise_for_status()
-        raw_text = response.json()["choices"][0]["message"]["content"]
+        raw_text = get_llm_client(base_url, api_key).chat(
+            [{"role": "user", "content": prompt}],
+            model="gpt-4",
+            timeout=200,
+            cache=cache,
+            # Don't cache replies that don't parse into slides
+            cache_if=lambda text: bool(clean_slide_json_response(text))
+        )
         slides = clean_slide_json_response(raw_text)
+        tracing.current_span().set(slides=len(slides))
         return slides
     except Exception as e:
         print("❌ Error calling LLM:", e)
@@ -1,16 +1,23 @@
 import os
 import streamlit as st
 import streamlit.components.v1 as components
-from app.report_writer import generate_report, remove_think_blocks
-from app.slides_planner import ask_llm_for_slides, deduplicate_charts
-from app.reveal_generator import generate_reveal_html
+from app.pipeline import ReportPipeline, PLAN_MODE, RESULT_DTYPE_BACKEND
 from config.config import vn
 from core.adapter import DBAdapter
+from core.registry import WARM_UP, get_registry
+from core.schema_catalog import schema_catalog
 import pandas as pd
-import json
 
-# --- Load training data (no cache) ---
-vn.load_training_data()
+# --- Agent (embedder, vector store connection, training data): built once per process and shared by sessions and reruns ---
+if get_registry().is_loaded("vanna"):
+    # Load training data (no cache)
+    vn.load_training_data()
+elif WARM_UP:
+    # First run: build in the background so the page renders right away. The sidebar below only
+    # uses st.session_state; `vn` is touched (and waited for) when a report or slides are generated.
+    # The agent is shared by all sessions, so each session's database goes to its pipeline, never to `vn`
+    get_registry().warm_up("vanna")
+
 
 # --- Page setup ---
 st.set_page_config(page_title="Vanna AI Report Assistant", layout="wide")
@@ -32,10 +39,10 @@ connect_btn = st.sidebar.button("Kết nối Endpoint")
 endpoint_tables = []
 if db_endpoint and connect_btn:
     try:
-        endpoint_adapter = DBAdapter(db_endpoint)
+        endpoint_adapter = DBAdapter(db_endpoint, dtype_backend=RESULT_DTYPE_BACKEND)
         endpoint_tables = endpoint_adapter.list_tables()
         st.sidebar.success(f"✅ Kết nối thành công! Các bảng: {endpoint_tables}")
-        vn.db_adapter = endpoint_adapter
+        st.session_state['db_adapter'] = endpoint_adapter
         st.session_state['db_mode'] = 'endpoint'
         st.session_state['endpoint_adapter'] = endpoint_adapter
         st.session_state['endpoint_tables'] = endpoint_tables
@@ -77,13 +84,12 @@ selected_db = st.sidebar.selectbox("🗃️ Available Databases", db_files)
 if selected_db:
     try:
         db_path = f"db/{selected_db}"
-        db_adapter = DBAdapter(f"sqlite:///{db_path}")
-        vn.db_adapter = db_adapter
-        vn.connect_to_sqlite(db_path)
+        db_adapter = DBAdapter(f"sqlite:///{db_path}", dtype_backend=RESULT_DTYPE_BACKEND)
+        st.session_state['db_adapter'] = db_adapter
 
         st.sidebar.success("✅ Connected to database")
 
-        all_schema = vn.extract_all_tables_schema()
+        all_schema = schema_catalog.describe(db_adapter)
         st.sidebar.markdown("---")
         st.sidebar.markdown("🗄️ **Database Schema:**")
         st.sidebar.text_area("📋 All Tables Schema", all_schema, height=300, disabled=True)
@@ -109,6 +115,12 @@ user_request = st.text_area(
     on_change=auto_generate_report
 )
 
+batch_planning = st.checkbox(
+    "⚡ Plan independent sub-questions in parallel batches",
+    value=PLAN_MODE == "batch",
+    help="The LLM proposes several independent sub-questions per round and their SQL runs concurrently."
+)
+
 trigger_report = st.button("🚀 Auto Plan & Generate Report") or st.session_state.get('trigger_auto_report', False)
 if st.session_state.get('trigger_auto_report'):
     st.session_state['trigger_auto_report'] = False
@@ -117,93 +129,54 @@ if trigger_report and user_request.strip():
     progress = st.progress(0, text="Starting Chain-of-Thought reasoning...")
     st.info("🧠 Step 1: Thinking about the sub-question...")
 
+    if st.session_state.get('db_adapter') is None:
+        st.error("❌ Database adapter not initialized.")
+        st.stop()
+    pipeline = ReportPipeline(vn, st.session_state['db_adapter'], plan_mode="batch" if batch_planning else "sequential")
+
     conversation_steps = []
     step = 0
 
-    while True:
-        # Đưa lại subquestion và kết quả từng step vào prompt, không đưa SQL, loại bỏ '__source__' khỏi result
-        def clean_result(result):
-            if isinstance(result, list):
-                return [
-                    {k: v for k, v in row.items() if k != "__source__"}
-                    for row in result
-                ]
-            return result
-        context = "\n".join([
-            f"Step {i+1}:\nSubquestion: {c['subquestion']}\nResult: {json.dumps(clean_result(c.get('result', '')), ensure_ascii=False, indent=2)}"
-            for i, c in enumerate(conversation_steps)
-        ])
-
-        cot_prompt = f"""
-You are an analytical assistant. The user asked:
-
-"{user_request}"
-
-{vn.extract_all_tables_schema()}
-
-So far, these are the subquestions completed:
-{context if context else "None yet."}
-
-What is the next subquestion you should answer to help generate the report?
-Respond in JSON format: {{ "subquestion": "...", "sql": "..." }}
-If no more are needed, return: DONE, NO MORE QUESTIONS ARE NEEDED!
-"""
-        response = vn.submit_prompt([
-            vn.system_message("You are a careful, step-by-step business analyst."),
-            vn.user_message(cot_prompt)
-        ])
-
-        step += 1
+    while len(conversation_steps) < pipeline.max_steps:
+        # Stream the LLM's answer so the reasoning shows up while it is generated
+        with st.expander(f"💭 LLM reasoning for step {step + 1}", expanded=True):
+            plan = pipeline.plan_next(user_request, conversation_steps, render=st.write_stream)
 
         # Check if done
-        if "DONE, NO MORE QUESTIONS ARE NEEDED!" in response.strip().upper():
-            # Extract LLM's reasoning if available
-            reasoning = None
-            # Try to extract reasoning after 'DONE' or in the response
-            if 'reason' in response.lower():
-                # Try to extract a reason field if present
-                try:
-                    resp_json = json.loads(response[response.find('{'):response.rfind('}')+1])
-                    reasoning = resp_json.get('reason')
-                except Exception:
-                    pass
-            if not reasoning:
-                # Fallback: try to extract any text after 'DONE' as reasoning
-                done_idx = response.upper().find('DONE')
-                after_done = response[done_idx+4:].strip()
-                if after_done:
-                    reasoning = after_done
-            st.info(f"✅ LLM determined that all questions are answered at step {step}.")
-            if reasoning:
-                st.markdown(f"**🤖 LLM reasoning for completion:**\n\n{reasoning}")
+        if plan["done"]:
+            st.info(f"✅ LLM determined that all questions are answered at step {step + 1}.")
+            if plan["reasoning"]:
+                st.markdown(f"**🤖 LLM reasoning for completion:**\n\n{plan['reasoning']}")
             break
 
-        # Parse response
-        try:
-            step_data = json.loads(response[response.find('{'):response.rfind('}')+1])
-        except Exception as e:
-            st.error(f"❌ Failed to parse response at step {step}: {e}")
+        if plan["error"]:
+            st.error(f"❌ Failed to parse response at step {step + 1}: {plan['error']}")
             break
 
-        # Debug: Show LLM's reasoning prompt and raw response
-        with st.expander(f"🧠 Debug: LLM Prompt & Response for Step {step}"):
-            st.markdown("**Prompt sent to LLM:**")
-            st.code(cot_prompt, language="markdown")
-            st.markdown("**Raw LLM response:**")
-            st.code(response, language="json")
+        # Independent queries run concurrently; wall-clock time is that of the slowest one
+        results = pipeline.execute(plan["batch"])
 
-        st.markdown(f"### 🔍 Step {step}: {step_data['subquestion']}")
-        st.code(step_data['sql'], language="sql")
+        failed = False
+        for step_data, df in zip(plan["batch"], results):
+            step += 1
 
-        try:
-            if vn.db_adapter is None:
-                st.error("❌ Database adapter not initialized.")
-                st.stop()
+            # Debug: Show LLM's reasoning prompt and raw response
+            with st.expander(f"🧠 Debug: LLM Prompt & Response for Step {step}"):
+                st.markdown("**Prompt sent to LLM:**")
+                st.code(plan["prompt"], language="markdown")
+                st.markdown("**Raw LLM response:**")
+                st.code(plan["response"], language="json")
+
+            st.markdown(f"### 🔍 Step {step}: {step_data['subquestion']}")
+            st.code(step_data['sql'], language="sql")
+
+            if isinstance(df, Exception):
+                st.error(f"❌ Query {step} failed: {df}")
+                failed = True
+                break
 
-            df = vn.db_adapter.run_sql(step_data['sql'])
-            df['__source__'] = step_data['subquestion']
-            step_data['result'] = df.head(5).to_dict(orient='records')  # limit preview
-            step_data['full_df'] = df  # keep full data for report
+            if step_data['truncated']:
+                st.warning(f"⚠️ Result of step {step} was truncated to {len(df)} rows to keep memory bounded.")
 
             # Debug: Show SQL result preview
             with st.expander(f"🗃️ SQL Result Preview for Step {step}"):
@@ -218,15 +191,14 @@ If no more are needed, return: DONE, NO MORE QUESTIONS ARE NEEDED!
             })
 
             st.success(f"✅ Query {step} executed successfully.")
-        except Exception as e:
-            st.error(f"❌ Query {step} failed: {e}")
+
+        if failed:
             break
 
         progress.progress(min(85, int(step * 15)), text=f"Finished Step {step}")
 
     # Combine data
-    all_dfs = [c['full_df'] for c in conversation_steps if 'full_df' in c]
-    combined_df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
+    combined_df = pipeline.combine(conversation_steps)
     st.session_state['current_df'] = combined_df
     st.session_state['current_plan'] = conversation_steps
     st.session_state['current_report_data'] = conversation_steps
@@ -234,27 +206,20 @@ If no more are needed, return: DONE, NO MORE QUESTIONS ARE NEEDED!
    # Final report generation
     progress.progress(90, text="📝 Generating report...")
 
-    combined_df = pd.concat([c['full_df'] for c in conversation_steps if 'full_df' in c], ignore_index=True) if conversation_steps else pd.DataFrame()
+    data_summary = pipeline.summarize(conversation_steps, combined_df)
 
-    report = generate_report(
-        question=user_request,
-        sql="\n".join([c['sql'] for c in conversation_steps]),
-        data_frame=combined_df,
-        llm_api_url=vn.base_url,
-        api_key=os.getenv("LLM_API_KEY")
-    )
-
-    report = remove_think_blocks(report)
+    st.markdown("## 📋 Final Report")
+    report = pipeline.write_report(user_request, conversation_steps, combined_df, data_summary, render=st.write_stream)
 
-    st.session_state['current_df'] = combined_df
-    st.session_state['current_plan'] = conversation_steps
-    st.session_state['current_report_data'] = conversation_steps
     st.session_state['current_report'] = report
+    st.session_state['stage_timings'] = pipeline.stage_totals()
 
     progress.progress(100, text="✅ Done!")
 
-    st.markdown("## 📋 Final Report")
-    st.markdown(report)
+    with st.expander("⏱️ Stage timings"):
+        st.table(pd.DataFrame(
+            [{"stage": name, "seconds": round(seconds, 2)} for name, seconds in pipeline.stage_totals().items()]
+        ))
 
 
 # --- Slide Generation ---
@@ -275,46 +240,21 @@ if st.session_state.get("current_report"):
                 current_df = st.session_state['current_df']
                 current_plan = st.session_state.get('current_plan', [])
                 current_report = st.session_state['current_report']
-                
-                # Create comprehensive metadata with column info
-                columns_info = []
-                for col in current_df.columns:
-                    col_type = str(current_df[col].dtype)
-                    unique_count = current_df[col].nunique()
-                    columns_info.append(f"{col} ({col_type}, {unique_count} unique values)")
-                
-                columns_str = '; '.join(columns_info)
-                if current_plan:
-                    subquestions_str = '; '.join(item['subquestion'] for item in current_plan)
-                    metadata = f"Dataset columns: {columns_str}. Analysis subquestions: {subquestions_str}"
-                else:
-                    metadata = f"Dataset columns: {columns_str}"
+                pipeline = ReportPipeline(vn, st.session_state.get('db_adapter'))
                 
                 slides_progress.progress(20, text="Calling LLM for slides...")
                 
-                # Call LLM to create slides
-                slides = ask_llm_for_slides(
-                    report_text=current_report,
-                    metadata=metadata,
-                    api_key=os.getenv("LLM_API_KEY"),
-                    base_url=vn.base_url
-                )
+                # Call LLM to create slides (charts already deduplicated)
+                slides = pipeline.plan_slides(current_report, current_df, current_plan)
                 
                 if not slides:
                     st.warning("⚠️ LLM returned empty slides. Please check your prompt or LLM connection.")
                     st.stop()
                 
-                slides_progress.progress(60, text="Deduplicating charts...")
-                slides = deduplicate_charts(slides)
-                
                 slides_progress.progress(80, text="Generating HTML...")
                 
-                # Generate HTML slides with clear df
-                html_string = generate_reveal_html(
-                    slides_json=slides,
-                    df=current_df,  # Pass current_df clearly
-                    return_html=True
-                )
+                # Generate HTML slides; charts are aggregated by the database from the step queries
+                html_string = pipeline.render_slides(slides, current_df, current_plan)
                 
                 # Save to session state
                 st.session_state['current_slides_html'] = html_string
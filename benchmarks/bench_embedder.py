@@ -0,0 +1,115 @@
+"""
+Benchmark the embedding backends (core/embedder.py) on CPU: load time, single-query latency
+(what retrieval pays per question), bulk throughput per batch size (training), and recall
+parity of each backend against the PyTorch fp32 model.
+
+    python -m benchmarks.bench_embedder --backends torch onnx int8 --threads 0 4 --synthetic 2000
+
+The corpus is the training data plus synthetic question => SQL entries over the benchmark
+schema; queries are the training questions and paraphrased synthetic questions.
+"""
+import argparse
+import json
+import random
+import time
+import numpy as np
+from benchmarks.synth_data import CATEGORIES, LOCATIONS, STATUSES, TRAINING_FILE
+from core.embedder import BACKENDS, EMBED_BATCH_SIZE, load_embedder, recall_parity
+from core.knowledge_store import KnowledgeStore
+
+MEASURES = ["gross_amount_after_tax", "discount_amount", "tax_rate_raw", "discount_percent"]
+DIMENSIONS = ["city", "country", "order_status", "order_source", "gateway_id", "discount_code"]
+PERIODS = ["last month", "last 6 months", "2024", "Q1 2025", "this year", "the last 30 days"]
+TEMPLATES = [
+    ("What is the total {measure} by {dimension} in {period}?", "Sum of {measure} per {dimension} for {period}"),
+    ("Which {dimension} has the highest average {measure} in {period}?", "Top {dimension} by mean {measure}, {period}"),
+    ("How many {status} orders were there in {city} during {period}?", "Count {status} orders for {city} over {period}"),
+    ("Show {category} sales trend for {period}", "Monthly revenue of {category} products in {period}"),
+]
+
+
+def build_texts(synthetic: int, seed: int = 0) -> tuple:
+    """(corpus, queries): training entries + synthetic question => SQL texts, and queries paraphrasing them"""
+    with open(TRAINING_FILE, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    corpus = [KnowledgeStore._entry_text(item) for item in items if KnowledgeStore._entry_text(item)]
+    queries = [item["question"] for item in items if "question" in item]
+
+    rng = random.Random(seed)
+    for _ in range(synthetic):
+        question, paraphrase = rng.choice(TEMPLATES)
+        values = {
+            "measure": rng.choice(MEASURES), "dimension": rng.choice(DIMENSIONS), "period": rng.choice(PERIODS),
+            "status": rng.choice(STATUSES[0]), "city": rng.choice(LOCATIONS)[0], "category": rng.choice(CATEGORIES),
+        }
+        sql = f"SELECT {values['dimension']}, SUM({values['measure']}) FROM orders GROUP BY {values['dimension']}"
+        corpus.append(f"{question.format(**values)} => {sql}")
+        if rng.random() < 0.2:
+            queries.append(paraphrase.format(**values))
+    return corpus, queries
+
+
+def latency(model, queries: list, repeat: int) -> dict:
+    """Per-query encode latency (batch of one), as paid by retrieval"""
+    times = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            model.encode([query])
+            times.append(time.perf_counter() - start)
+    times = np.sort(times)
+    return {"p50_ms": float(np.percentile(times, 50) * 1000), "p95_ms": float(np.percentile(times, 95) * 1000)}
+
+
+def throughput(model, corpus: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    model.encode(corpus, batch_size=batch_size)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Inference threads to try (0 = library default)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[16, 32, EMBED_BATCH_SIZE, 128])
+    parser.add_argument("--synthetic", type=int, default=2000, help="Synthetic corpus entries")
+    parser.add_argument("--latency-queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.95, help="Parity threshold for recall@k")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    corpus, queries = build_texts(args.synthetic)
+    print(f"Corpus: {len(corpus):,} texts, {len(queries):,} queries")
+    reference = load_embedder(args.model, backend="torch", threads=0)
+
+    results = []
+    for backend in args.backends:
+        for threads in args.threads:
+            start = time.perf_counter()
+            model = reference if backend == "torch" and not threads else load_embedder(args.model, backend=backend, threads=threads)
+            row = {"backend": backend, "threads": threads, "load_seconds": time.perf_counter() - start}
+            model.encode(queries[:8])  # warm-up
+            row.update(latency(model, queries[:args.latency_queries], args.repeat))
+            row["texts_per_sec"] = {bs: throughput(model, corpus, bs) for bs in args.batch_sizes}
+            row["parity"] = recall_parity(reference, model, corpus, queries, k=args.k)
+            results.append(row)
+
+            best_bs, best_tps = max(row["texts_per_sec"].items(), key=lambda item: item[1])
+            parity = row["parity"]
+            verdict = "✅" if parity["recall_at_k"] >= args.min_recall else "❌"
+            print(f"{backend:>5} threads={threads or 'default':<7} | load {row['load_seconds']:5.1f}s | "
+                  f"query p50 {row['p50_ms']:6.2f}ms p95 {row['p95_ms']:6.2f}ms | "
+                  f"bulk {best_tps:8.0f} texts/s (batch {best_bs}) | "
+                  f"recall@{parity['k']} {parity['recall_at_k']:.3f} cos {parity['mean_cosine']:.4f} {verdict}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
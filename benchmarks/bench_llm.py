@@ -0,0 +1,115 @@
+"""
+Load test the LLM client paths (LLMClient.chat / stream_chat, with their retries) against an
+OpenAI-compatible endpoint: by default an in-process mock server (benchmarks/mock_llm_server.py)
+with the given latency, token rate and error injection. Reports throughput, latency and
+time-to-first-token percentiles, and client-visible errors.
+
+    python -m benchmarks.bench_llm --requests 200 --concurrency 1 8 32 \\
+        --latency lognormal:0.5,0.6 --tokens-per-sec 80 --error-rate 0.05 --stream
+    python -m benchmarks.bench_llm --url http://127.0.0.1:8900/v1 --requests 100
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.mock_llm_server import MockLLMServer, _percentile
+from core.llm_client import LLMClient
+
+PROMPT = "Write a short analysis report of last month's orders."
+
+
+def run_load(client: LLMClient, requests: int, concurrency: int, stream: bool, model: str = "gpt-4") -> dict:
+    """Send `requests` completions with `concurrency` threads; returns throughput, percentiles and errors"""
+    def one(i):
+        messages = [{"role": "user", "content": f"{PROMPT} (request {i})"}]
+        start = time.perf_counter()
+        first = None
+        try:
+            if stream:
+                for _ in client.stream_chat(messages, model=model, cache=False):
+                    if first is None:
+                        first = time.perf_counter() - start
+            else:
+                client.chat(messages, model=model, cache=False)
+            return {"seconds": time.perf_counter() - start, "ttft": first, "error": None}
+        except Exception as e:
+            return {"seconds": time.perf_counter() - start, "ttft": first, "error": type(e).__name__}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r["seconds"] for r in results if r["error"] is None)
+    ttfts = sorted(r["ttft"] for r in results if r["ttft"] is not None)
+    errors = {}
+    for r in results:
+        if r["error"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        **{f"p{int(q * 100)}": _percentile(latencies, q) for q in (0.5, 0.95, 0.99)},
+        "ttft_p50": _percentile(ttfts, 0.5),
+        "ttft_p99": _percentile(ttfts, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Endpoint base URL; omit to start an in-process mock server")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--stream", action="store_true", help="Use stream_chat and report time to first token")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--latency", default="lognormal:0.5,0.6", help="Mock server time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--error-codes", default="429,500,503")
+    parser.add_argument("--report-words", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = MockLLMServer(
+            latency=args.latency, tokens_per_sec=args.tokens_per_sec, error_rate=args.error_rate,
+            error_codes=[int(c) for c in args.error_codes.split(",") if c.strip()],
+            report_words=args.report_words, seed=args.seed,
+        ).start()
+        url = server.url
+        print(f"🤖 Mock LLM server on {url}: latency={args.latency}, {args.tokens_per_sec:g} tokens/s, "
+              f"error rate {args.error_rate:.0%}")
+
+    results = []
+    try:
+        print(f"{'conc':>5} | {'ok':>5} | {'errors':>6} | {'req/s':>7} | {'p50':>7} | {'p95':>7} | {'p99':>7} | {'ttft p50':>8}")
+        for concurrency in args.concurrency:
+            client = LLMClient(url, api_key="bench", max_retries=args.max_retries, pool_size=concurrency)
+            if server is not None:
+                server.reset_stats()
+            row = run_load(client, args.requests, concurrency, args.stream)
+            if server is not None:
+                row["server"] = server.stats()
+            results.append(row)
+            ttft = f"{row['ttft_p50']:8.3f}" if row["ttft_p50"] is not None else f"{'-':>8}"
+            print(f"{concurrency:>5} | {row['ok']:>5} | {sum(row['errors'].values()):>6} | {row['throughput_rps']:>7.2f} | "
+                  f"{row['p50'] or 0:>7.3f} | {row['p95'] or 0:>7.3f} | {row['p99'] or 0:>7.3f} | {ttft}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark summarize_dataframe: the previous pandas implementation vs the single-pass
+profiling engine (exact and approximate/sketch mode).
+
+    python -m benchmarks.bench_summarize --rows 1000000 10000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from app.report_writer import summarize_dataframe
+
+
+def legacy_summarize_dataframe(df: pd.DataFrame) -> str:
+    """summarize_dataframe before the profiling engine (one or more full passes per statistic)"""
+    lines = [f"🔹 Dataset: {len(df)} rows × {len(df.columns)} columns", "\n🔸 Column Overview:"]
+    for col in df.columns:
+        lines.append(f"  - {col} ({df[col].dtype}) | nulls: {df[col].isnull().sum()}, unique: {df[col].nunique()}")
+    numeric_cols = df.select_dtypes(include=["number"]).columns
+    if len(numeric_cols) > 0:
+        lines.append("\n📊 Numeric Summary:")
+        desc = df[numeric_cols].describe().T
+        desc["skew"] = df[numeric_cols].skew()
+        for col in desc.index:
+            row = desc.loc[col]
+            lines.append(
+                f"  - {col}: mean={row['mean']:.2f}, std={row['std']:.2f}, min={row['min']}, max={row['max']}, skew={row['skew']:.2f}"
+            )
+    lines.append("\n⚠️ Potential Outliers (IQR Method):")
+    for col in numeric_cols:
+        q1 = df[col].quantile(0.25)
+        q3 = df[col].quantile(0.75)
+        iqr = q3 - q1
+        outliers = df[(df[col] < q1 - 1.5 * iqr) | (df[col] > q3 + 1.5 * iqr)]
+        if not outliers.empty:
+            top_outlier_vals = outliers[col].nlargest(3).round(2).tolist()
+            lines.append(f"  - {col}: {len(outliers)} outliers | IQR=({q1:.2f}, {q3:.2f}) | Top values: {top_outlier_vals}")
+        else:
+            lines.append(f"  - {col}: No outliers detected | IQR=({q1:.2f}, {q3:.2f})")
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        lines.append(f"\n🔠 Top values in '{col}':")
+        for val, count in df[col].value_counts().head(3).items():
+            lines.append(f"  - {val}: {count} rows")
+    for col in df.select_dtypes(include=["datetime", "datetime64[ns]"]).columns:
+        lines.append(f"\n🗓️ Datetime column: {col}")
+        lines.append(f"  - Range: {df[col].min()} → {df[col].max()}")
+    return "\n".join(lines)
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Orders-like result set: ids, skewed amounts with nulls, quantities, categories, customers and dates"""
+    rng = np.random.default_rng(seed)
+    amount = rng.lognormal(4, 1, rows)
+    amount[rng.random(rows) < 0.02] = np.nan
+    categories = np.array([f"category_{i}" for i in range(50)], dtype=object)
+    return pd.DataFrame({
+        "order_id": np.arange(rows, dtype=np.int64),
+        "product_id": rng.integers(1, 20_000, rows),
+        "quantity": rng.integers(1, 10, rows),
+        "total_amount": amount,
+        "category_name": categories[rng.zipf(1.5, rows) % len(categories)],
+        "customer_email": "customer" + pd.Series(rng.integers(0, rows // 2, rows)).astype(str) + "@example.com",
+        "order_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"),
+    })
+
+
+def timed(fn, *args, repeat: int = 1, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} | {'legacy':>9} | {'exact':>9} | {'approx':>9} | speedup exact / approx")
+    for rows in args.rows:
+        df = make_frame(rows)
+        legacy = timed(legacy_summarize_dataframe, df, repeat=args.repeat)
+        exact = timed(summarize_dataframe, df, approx_rows=0, repeat=args.repeat)
+        approx = timed(summarize_dataframe, df, approx_rows=1, repeat=args.repeat)
+        print(f"{rows:>12,} | {legacy:>8.2f}s | {exact:>8.2f}s | {approx:>8.2f}s | {legacy / exact:.1f}x / {legacy / approx:.1f}x")
+        del df
+
+
+if __name__ == "__main__":
+    main()
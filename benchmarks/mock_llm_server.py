@@ -0,0 +1,456 @@
+"""
+Local OpenAI-compatible stand-in for the LLM gateway, for load tests and offline perf work.
+Serves POST /chat/completions (also under /v1) with plain and streamed (SSE) responses,
+sampled latency, a token rate for generation, and injected 429/5xx errors. GET /stats
+returns request counts and server-side latency percentiles.
+
+    python -m benchmarks.mock_llm_server --port 8900 --latency lognormal:0.8,0.5 \\
+        --tokens-per-sec 60 --error-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:8900/v1 LLM_API_URL=http://127.0.0.1:8900 python -m app.pipeline ...
+
+Responses come from, in order: a completion cache file recorded by real runs
+(--replay, same keys as core/llm_cache.py), regex rules from a JSON script
+(--script, see `load_script`), then a built-in responder that understands the
+planning, SQL, report and slides prompts well enough to drive the whole pipeline.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.llm_cache import completion_key
+from core.prompt_context import count_tokens
+
+DONE_MARKER = "DONE, NO MORE QUESTIONS ARE NEEDED!"
+
+# Column names that make good GROUP BY dimensions in the built-in plans
+DIMENSION_HINTS = ("status", "city", "country", "region", "category", "source", "type", "gateway")
+NUMERIC_TYPES = ("REAL", "NUMERIC", "DECIMAL", "FLOAT", "DOUBLE", "MONEY")
+TEXT_TYPES = ("TEXT", "CHAR", "STRING", "CLOB")
+
+
+def parse_latency(spec: str):
+    """
+    Latency spec -> function returning seconds. Forms: fixed:S, uniform:A,B, normal:MU,SIGMA,
+    lognormal:MEDIAN,SIGMA (sigma of the underlying normal) and exp:MEAN.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    kind = kind.strip().lower()
+    try:
+        if kind == "fixed":
+            (seconds,) = values or [0.0]
+            return lambda rng: seconds
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == "normal":
+            mu, sigma = values
+            return lambda rng: max(0.0, rng.gauss(mu, sigma))
+        if kind == "lognormal":
+            median, sigma = values
+            if median <= 0:
+                return lambda rng: 0.0
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == "exp":
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency spec: {spec!r}")
+
+
+def load_script(path: str) -> list:
+    """
+    Scripted responses from a JSON file: {"rules": [{"match": "regex", "response": "..."}]}.
+    `match` is searched in the last user message; `response` may be a list, served in rotation.
+    The first matching rule wins.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = []
+    for rule in data.get("rules", data if isinstance(data, list) else []):
+        responses = rule["response"] if isinstance(rule["response"], list) else [rule["response"]]
+        rules.append({"pattern": re.compile(rule.get("match", ""), re.DOTALL), "responses": itertools.cycle(responses)})
+    return rules
+
+
+class ReplayCache:
+    """Read-only view of a CompletionCache SQLite file (expiry is ignored on replay)"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM completions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """
+    The mock server. Use from the command line (see module docstring) or in-process:
+
+        server = MockLLMServer(latency="fixed:0.2", tokens_per_sec=50).start()
+        ...  # point clients at server.url
+        server.stop()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "fixed:0", tokens_per_sec: float = 0,
+                 error_rate: float = 0.0, error_codes=(429, 500, 503), retry_after: float | None = 1.0,
+                 replay: str | None = None, script: str | None = None, plan_steps: int = 2,
+                 report_words: int = 300, seed: int | None = None, log: bool = False):
+        super().__init__((host, port), _Handler)
+        self.latency = parse_latency(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        self.retry_after = retry_after
+        self.replay = ReplayCache(replay) if replay else None
+        self.rules = load_script(script) if script else []
+        self.plan_steps = plan_steps
+        self.report_words = report_words
+        self.log = log
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        """Serve in a background thread; returns self"""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def handle_error(self, request, client_address):
+        # Clients drop keep-alive connections (e.g. after a retried streamed request); not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    # --- Behaviour ---
+
+    def sample(self) -> dict:
+        """Draw this request's injected error (or None) and time to first token"""
+        with self._rng_lock:
+            error = self.rng.choice(self.error_codes) if self.error_codes and self.rng.random() < self.error_rate else None
+            return {"error": error, "latency": self.latency(self.rng)}
+
+    def respond(self, payload: dict) -> tuple:
+        """(content, source) for a chat completions payload"""
+        messages = payload.get("messages") or []
+        if self.replay is not None:
+            params = {k: v for k, v in payload.items() if k not in ("model", "messages", "stream")}
+            cached = self.replay.get(completion_key(payload.get("model"), messages, **params))
+            if cached is not None:
+                return cached, "replay"
+        prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        for rule in self.rules:
+            if rule["pattern"].search(prompt):
+                with self._rng_lock:
+                    return next(rule["responses"]), "script"
+        system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        return builtin_response(prompt, system, self.plan_steps, self.report_words), "builtin"
+
+    # --- Stats ---
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {"requests": 0, "streamed": 0, "status": {}, "source": {}, "injected_errors": 0,
+                           "completion_tokens": 0, "latencies": []}
+
+    def record(self, status: int, seconds: float, source: str | None = None, streamed: bool = False,
+               tokens: int = 0, injected: bool = False):
+        with self._stats_lock:
+            stats = self._stats
+            stats["requests"] += 1
+            stats["streamed"] += streamed
+            stats["injected_errors"] += injected
+            stats["completion_tokens"] += tokens
+            stats["status"][str(status)] = stats["status"].get(str(status), 0) + 1
+            if source:
+                stats["source"][source] = stats["source"].get(source, 0) + 1
+            stats["latencies"].append(seconds)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items() if k != "latencies"}
+            latencies = sorted(self._stats["latencies"])
+        stats["latency"] = {f"p{int(q * 100)}": _percentile(latencies, q) for q in (0.5, 0.95, 0.99)}
+        stats["latency"]["max"] = latencies[-1] if latencies else None
+        return stats
+
+
+def _percentile(values: list, q: float) -> float | None:
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockLLMServer
+
+    def log_message(self, format, *args):
+        if self.server.log:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self._send_json(200, self.server.stats())
+        elif self.path.rstrip("/") in ("/health", "/v1/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_DELETE(self):
+        if self.path.rstrip("/") in ("/stats", "/v1/stats"):
+            self.server.reset_stats()
+            self._send_json(200, {"reset": True})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": {"message": f"Invalid JSON: {e}"}})
+            self.server.record(400, time.perf_counter() - start)
+            return
+
+        server = self.server
+        draw = server.sample()
+        time.sleep(draw["latency"])
+        if draw["error"]:
+            headers = {}
+            if draw["error"] in (429, 503) and server.retry_after is not None:
+                headers["Retry-After"] = f"{server.retry_after:g}"
+            message = "Rate limit exceeded" if draw["error"] == 429 else "Injected server error"
+            self._send_json(draw["error"], {"error": {"message": message, "type": "mock_error"}}, headers)
+            server.record(draw["error"], time.perf_counter() - start, injected=True)
+            return
+
+        content, source = server.respond(payload)
+        tokens = _split_tokens(content)
+        model = payload.get("model") or "mock"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if payload.get("stream"):
+            self._stream(completion_id, model, tokens)
+        else:
+            if server.tokens_per_sec > 0:
+                time.sleep(len(tokens) / server.tokens_per_sec)
+            prompt_tokens = sum(count_tokens(m.get("content") or "") for m in payload.get("messages") or [])
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)},
+            })
+        server.record(200, time.perf_counter() - start, source, bool(payload.get("stream")), len(tokens))
+
+    def _stream(self, completion_id: str, model: str, tokens: list):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1 / self.server.tokens_per_sec if self.server.tokens_per_sec > 0 else 0
+        created = int(time.time())
+        try:
+            for i, token in enumerate(tokens):
+                if i and delay:
+                    time.sleep(delay)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            self._write_chunk(f"data: {json.dumps(final)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client went away mid-stream
+            self.close_connection = True
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _split_tokens(text: str) -> list:
+    """Rough streaming tokens: words with their trailing whitespace"""
+    return re.findall(r"\s*\S+\s*", text) or [text]
+
+
+# --- Built-in responder ---
+
+def builtin_response(prompt: str, system: str = "", plan_steps: int = 2, report_words: int = 300) -> str:
+    """Plausible responses for the prompts this repo sends, derived from the schema or columns they contain"""
+    if DONE_MARKER in prompt:
+        return _plan_response(prompt, plan_steps)
+    if "presentation slides" in prompt or "Dataset columns:" in prompt:
+        return json.dumps(_slides(prompt), ensure_ascii=False)
+    if "SQL" in system:
+        candidates = _candidate_queries(_parse_schema(system + "\n" + prompt))
+        return f"Using the main fact table.\n\n```sql\n{candidates[0]['sql']}\n```"
+    return _report(report_words)
+
+
+def _parse_schema(text: str) -> dict:
+    """{table: [(column, TYPE), ...]} from 'Table: x / Columns: / - col: TYPE' blocks"""
+    tables = {}
+    for match in re.finditer(r"Table: (\S+)\s*\nColumns:\n((?:\s+- .+\n?)+)", text):
+        tables[match.group(1)] = re.findall(r"- ([^:\n]+): ([^\n]+)", match.group(2))
+    return tables
+
+
+def _candidate_queries(tables: dict) -> list:
+    """Independent subquestions over the widest table: totals and counts by dimension, monthly trend"""
+    if not tables:
+        return [{"subquestion": "How many rows are there?", "sql": "SELECT 1 AS row_count"}]
+    table, columns = max(tables.items(), key=lambda item: len(item[1]))
+    names = [name.strip() for name, _ in columns]
+    types = {name.strip(): col_type.upper() for name, col_type in columns}
+    dates = [n for n in names if re.search(r"date|time|created", n, re.I)]
+    texts = [n for n in names if n not in dates and any(t in types[n] for t in TEXT_TYPES)]
+    dimensions = [n for n in texts if any(h in n.lower() for h in DIMENSION_HINTS)] or texts
+    measures = [n for n in names if any(t in types[n] for t in NUMERIC_TYPES)]
+
+    queries = []
+    if dimensions and measures:
+        queries.append({
+            "subquestion": f"What is the total {measures[0]} by {dimensions[0]}?",
+            "sql": f"SELECT {dimensions[0]}, SUM({measures[0]}) AS total_{measures[0]} FROM {table} "
+                   f"GROUP BY {dimensions[0]} ORDER BY total_{measures[0]} DESC LIMIT 20",
+        })
+    for dimension in dimensions[1:3] or dimensions[:1]:
+        queries.append({
+            "subquestion": f"How many {table} rows are there per {dimension}?",
+            "sql": f"SELECT {dimension}, COUNT(*) AS row_count FROM {table} GROUP BY {dimension} ORDER BY row_count DESC LIMIT 20",
+        })
+    if dates and measures:
+        queries.append({
+            "subquestion": f"How does {measures[0]} trend by month?",
+            "sql": f"SELECT SUBSTR({dates[0]}, 1, 7) AS month, SUM({measures[0]}) AS total_{measures[0]} FROM {table} "
+                   f"GROUP BY month ORDER BY month",
+        })
+    return queries or [{"subquestion": f"How many rows are in {table}?", "sql": f"SELECT COUNT(*) AS row_count FROM {table}"}]
+
+
+def _plan_response(prompt: str, plan_steps: int) -> str:
+    done = len(re.findall(r"^Step \d+:", prompt, re.M))
+    candidates = _candidate_queries(_parse_schema(prompt))
+    batch = re.search(r"List up to (\d+) subquestions", prompt)
+    if batch:
+        if done:
+            return f"{DONE_MARKER} The completed subquestions cover the request."
+        return json.dumps(candidates[:int(batch.group(1))], ensure_ascii=False)
+    if done >= min(plan_steps, len(candidates)):
+        return f"{DONE_MARKER} The completed subquestions cover the request."
+    return json.dumps(candidates[done], ensure_ascii=False)
+
+
+def _slides(prompt: str) -> list:
+    columns = re.findall(r"(\w+) \(([\w\[\]]+), \d+ unique values\)", prompt)
+    columns = [(name, dtype) for name, dtype in columns if name != "__source__"]
+    categorical = [n for n, dtype in columns if dtype in ("object", "str", "string", "category")]
+    numeric = [n for n, dtype in columns if re.match(r"u?int|float|Int|Float|double", dtype)]
+    slides = [{"title": "Introduction", "content": ["• Scope of the analysis", "• Data sources and method"],
+               "chart_column": None, "chart_value": None, "chart_type": None}]
+    if categorical and numeric:
+        slides.append({"title": f"{numeric[0]} by {categorical[0]}", "content": ["• Largest groups lead the total"],
+                       "chart_column": categorical[0], "chart_value": numeric[0], "chart_type": "bar"})
+    if numeric:
+        slides.append({"title": f"Distribution of {numeric[0]}", "content": ["• Most values fall in a narrow band"],
+                       "chart_column": numeric[0], "chart_value": numeric[0], "chart_type": "histogram"})
+    slides.append({"title": "Conclusion", "content": ["• Key takeaways", "• Next steps"],
+                   "chart_column": None, "chart_value": None, "chart_type": None})
+    return slides
+
+
+_REPORT_WORDS = ("the results show steady demand across the main segments while a few groups account for most of "
+                 "the total and smaller groups contribute a long tail that is worth monitoring over time").split()
+
+
+def _report(words: int) -> str:
+    body = " ".join(itertools.islice(itertools.cycle(_REPORT_WORDS), max(words, 1)))
+    return f"# Analysis Report\n\n## Key Findings\n\n{body.capitalize()}.\n\n## Recommendations\n\n- Review the largest groups.\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="fixed:0", help="Time to first token, e.g. lognormal:0.8,0.5 (default: fixed:0)")
+    parser.add_argument("--tokens-per-sec", type=float, default=0, help="Generation rate, also for non-streamed replies (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an injected error")
+    parser.add_argument("--error-codes", default="429,500,503", help="Status codes to inject, comma separated")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429/503 (negative = omit)")
+    parser.add_argument("--replay", help="Completion cache SQLite file to replay recorded responses from")
+    parser.add_argument("--script", help="JSON file of regex -> response rules")
+    parser.add_argument("--plan-steps", type=int, default=2, help="Sub-questions the built-in planner asks before DONE")
+    parser.add_argument("--report-words", type=int, default=300, help="Length of built-in reports")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--log", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port, latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate, error_codes=[int(c) for c in args.error_codes.split(",") if c.strip()],
+        retry_after=args.retry_after if args.retry_after >= 0 else None, replay=args.replay, script=args.script,
+        plan_steps=args.plan_steps, report_words=args.report_words, seed=args.seed, log=args.log,
+    )
+    print(f"🤖 Mock LLM server on {server.url} (stats at {server.url[:-3]}/stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Offline benchmark of the question-to-report stages on synthetic data (no LLM or vector store):
+DBAdapter.run_sql on the training queries, summarize_dataframe / summarize_sql,
+generate_chart_data, prepare_slides_data (DataFrame and database charts) and
+generate_reveal_html. Each stage reports its best wall time and, from one extra run, its
+memory: the tracemalloc peak (Python and NumPy allocations), the peak of Arrow's allocator
+(buffers of pyarrow-backed frames, which tracemalloc does not see) and the growth of the
+process's peak RSS (native allocations of any kind; 0 when an earlier stage peaked higher).
+
+    python -m benchmarks.run_benchmarks --scale 10k 1m --json bench_results.json
+
+Databases are generated under --data-dir on first use (see benchmarks/synth_data.py).
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import pyarrow as pa
+from app import reveal_generator
+from app.pipeline import RESULT_DTYPE_BACKEND
+from app.report_writer import summarize_dataframe, summarize_sql
+from app.reveal_generator import generate_chart_data, generate_reveal_html, prepare_slides_data
+from benchmarks.synth_data import SCALES, TRAINING_FILE, generate_database
+from core.adapter import DBAdapter
+
+# Result set the data-side stages work on
+FRAME_SQL = "SELECT * FROM orders"
+
+CHART_SPECS = [
+    ("city", "gross_amount_after_tax", "bar"),
+    ("order_status", "gross_amount_after_tax", "pie"),
+    ("date_created", "gross_amount_after_tax", "line"),
+    ("gross_amount_after_tax", "gross_amount_after_tax", "histogram"),
+]
+
+SLIDES = [
+    {"title": "Overview", "content": ["Synthetic benchmark report"]},
+    *[
+        {"title": f"{chart_type.title()} of {column}", "content": ["Chart slide"],
+         "chart_column": column, "chart_value": value, "chart_type": chart_type}
+        for column, value, chart_type in CHART_SPECS
+    ],
+    {"title": "Conclusion", "content": ["End"]},
+]
+
+
+def training_queries(path: str = TRAINING_FILE) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [(item["question"], item["sql"]) for item in items if isinstance(item, dict) and item.get("sql")]
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _arrow_peak(stop: threading.Event, baseline: int, out: dict, interval: float = 0.001):
+    """Poll Arrow's allocated bytes until `stop`; Arrow has no resettable peak counter"""
+    peak = 0
+    while True:
+        peak = max(peak, pa.total_allocated_bytes() - baseline)
+        if stop.wait(interval):
+            break
+    out["peak"] = max(peak, pa.total_allocated_bytes() - baseline)
+
+
+def measure(fn, repeat: int = 1, memory: bool = True) -> dict:
+    """Best wall time over `repeat` runs, plus the memory peaks of one extra run (see module docstring)"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    stats = {"seconds": best, "peak_mb": None, "arrow_mb": None, "rss_mb": None, "result": result}
+    if memory:
+        rss_before = _max_rss_mb()
+        stop, arrow = threading.Event(), {}
+        sampler = threading.Thread(target=_arrow_peak, args=(stop, pa.total_allocated_bytes(), arrow), daemon=True)
+        sampler.start()
+        tracemalloc.start()
+        try:
+            fn()
+            stats["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+            stop.set()
+            sampler.join()
+        stats["arrow_mb"] = arrow["peak"] / 1024 / 1024
+        stats["rss_mb"] = _max_rss_mb() - rss_before
+    return stats
+
+
+def bench_scale(db_path: str, max_rows: int, repeat: int, memory: bool) -> list:
+    adapter = DBAdapter(f"sqlite:///{db_path}", max_rows=max_rows, dtype_backend=RESULT_DTYPE_BACKEND, result_cache=False)
+    results = []
+
+    def record(stage, fn, note=None):
+        stats = measure(fn, repeat=repeat, memory=memory)
+        results.append({"stage": stage, "seconds": stats["seconds"], "peak_mb": stats["peak_mb"],
+                        "arrow_mb": stats["arrow_mb"], "rss_mb": stats["rss_mb"], "note": note})
+        return stats["result"]
+
+    for i, (question, sql) in enumerate(training_queries(), start=1):
+        df = record(f"run_sql[q{i}]", lambda: adapter.run_sql(sql))
+        results[-1]["note"] = f"{len(df):,} rows{' (truncated)' if df.attrs.get('truncated') else ''} | {question}"
+
+    df = record("run_sql[frame]", lambda: adapter.run_sql(FRAME_SQL))
+    results[-1]["note"] = f"{len(df):,} rows | {FRAME_SQL}"
+
+    record("summarize_dataframe", lambda: summarize_dataframe(df, approx_rows=0), note="exact")
+    record("summarize_dataframe[approx]", lambda: summarize_dataframe(df, approx_rows=1), note="sketch mode")
+    record("summarize_sql", lambda: summarize_sql(adapter, FRAME_SQL), note="computed in the database (full table)")
+
+    for column, value, chart_type in CHART_SPECS:
+        record(f"generate_chart_data[{chart_type}]", lambda: generate_chart_data(df, column, value, chart_type),
+               note=f"{value} by {column}")
+
+    sources = [{"sql": FRAME_SQL, "columns": list(df.columns), "name": "orders"}]
+    prepared = record("prepare_slides_data[dataframe]", lambda: prepare_slides_data(SLIDES, df))
+    record("prepare_slides_data[database]", lambda: prepare_slides_data(SLIDES, df, sources=sources, db_adapter=adapter),
+           note="charts aggregated over the full table")
+    payload = len(json.dumps(prepared, default=str))
+    results[-2]["note"] = f"chart payload {payload / 1024:.1f} KiB"
+
+    def render_cold():
+        reveal_generator._render_cache.clear()
+        return generate_reveal_html(SLIDES, df, return_html=True, sources=sources, db_adapter=adapter)
+
+    record("generate_reveal_html[cold]", render_cold)
+    record("generate_reveal_html[warm]", lambda: generate_reveal_html(SLIDES, df, return_html=True, sources=sources, db_adapter=adapter),
+           note="render cache hit; charts still prepared")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", nargs="+", default=["10k", "100k"], help=f"Scales to run: {', '.join(SCALES)} or a row count")
+    parser.add_argument("--data-dir", default="bench_data", help="Where synthetic databases are kept (default: bench_data)")
+    parser.add_argument("--max-rows", type=int, default=1_000_000, help="Row limit for fetched results")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip the memory measurement runs")
+    parser.add_argument("--json", help="Also write results to this JSON file")
+    args = parser.parse_args()
+
+    all_results = {}
+    for scale in args.scale:
+        orders = SCALES.get(scale.lower()) or int(scale)
+        db_path = os.path.join(args.data_dir, f"orders_{scale.lower()}.db")
+        if not os.path.exists(db_path):
+            print(f"⚙️ Generating {orders:,} orders into {db_path}...")
+            generate_database(db_path, orders)
+
+        print(f"\n=== {scale}: {orders:,} orders ===")
+        results = bench_scale(db_path, args.max_rows, args.repeat, not args.no_memory)
+        print(f"{'stage':<34} | {'seconds':>8} | {'peak MB':>8} | {'arrow MB':>8} | {'+RSS MB':>8} | note")
+        for row in results:
+            mem = " | ".join(f"{row[key]:8.1f}" if row[key] is not None else f"{'-':>8}" for key in ("peak_mb", "arrow_mb", "rss_mb"))
+            print(f"{row['stage']:<34} | {row['seconds']:8.3f} | {mem} | {row['note'] or ''}")
+        all_results[scale] = results
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        print(f"\n📁 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Synthetic e-commerce database for benchmarks, following the categories/products/orders DDL in
+training_data/training.json. Rows are generated with NumPy in chunks, so memory stays flat from
+10k to 50M orders.
+
+    python -m benchmarks.synth_data --orders 1000000 --out bench_data/orders_1m.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+TRAINING_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "training_data", "training.json")
+
+# Named scales accepted by --scale and the benchmark runner
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000, "50m": 50_000_000}
+
+CATEGORIES = [
+    "Electronics", "Clothing", "Home & Kitchen", "Books", "Beauty", "Sports", "Toys", "Grocery",
+    "Automotive", "Health", "Jewelry", "Office", "Garden", "Pet Supplies", "Music", "Shoes",
+    "Baby", "Furniture", "Tools", "Video Games",
+]
+LOCATIONS = [
+    ("Hanoi", "Hanoi", "Vietnam"), ("Ho Chi Minh City", "Ho Chi Minh", "Vietnam"), ("Da Nang", "Da Nang", "Vietnam"),
+    ("Bangkok", "Bangkok", "Thailand"), ("Singapore", "Singapore", "Singapore"), ("Kuala Lumpur", "Selangor", "Malaysia"),
+    ("Jakarta", "Jakarta", "Indonesia"), ("Manila", "Metro Manila", "Philippines"), ("Tokyo", "Tokyo", "Japan"),
+    ("Osaka", "Osaka", "Japan"), ("Seoul", "Seoul", "South Korea"), ("Sydney", "New South Wales", "Australia"),
+    ("New York", "New York", "United States"), ("Los Angeles", "California", "United States"),
+    ("San Francisco", "California", "United States"), ("London", "England", "United Kingdom"),
+    ("Paris", "Ile-de-France", "France"), ("Berlin", "Berlin", "Germany"), ("Toronto", "Ontario", "Canada"),
+    ("Sao Paulo", "Sao Paulo", "Brazil"),
+]
+FIRST_NAMES = ["An", "Binh", "Chi", "Dung", "Giang", "Hoa", "Khanh", "Linh", "Minh", "Nam", "Phuong", "Quang",
+               "John", "Mary", "David", "Sarah", "James", "Emma", "Kenji", "Yuki", "Lucas", "Sofia"]
+LAST_NAMES = ["Nguyen", "Tran", "Le", "Pham", "Hoang", "Vo", "Smith", "Johnson", "Brown", "Garcia", "Tanaka", "Kim", "Silva"]
+STATUSES = (["completed", "pending", "processing", "cancelled", "refunded"], [0.7, 0.08, 0.07, 0.1, 0.05])
+CANCEL_REASONS = ["Customer changed mind", "Payment failed", "Out of stock", "Shipping delay", "Duplicate order", "Fraud suspected"]
+DISCOUNT_CODES = ["WELCOME10", "SUMMER20", "FREESHIP", "VIP15", "FLASH30", "BLACKFRIDAY", "NEWYEAR25", "LOYALTY5"]
+GATEWAYS = ["stripe", "paypal", "momo", "vnpay", "cod", "bank_transfer"]
+SOURCES = ["web", "mobile_app", "marketplace", "social", "pos"]
+
+
+def load_ddl(path: str = TRAINING_FILE) -> list:
+    """CREATE TABLE statements from the training data, in file order"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [item["ddl"] for item in items if isinstance(item, dict) and item.get("ddl")]
+
+
+def generate_database(path: str, orders: int, chunk_size: int = 500_000, products: int | None = None,
+                      days: int = 730, seed: int = 0, log=print) -> str:
+    """
+    Create (or replace) a SQLite database at `path` with `orders` order rows.
+    Dates cover the `days` days before today, so "last N months" queries return data.
+    """
+    products = products or max(100, min(orders // 50, 50_000))
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for ddl in load_ddl():
+        conn.execute(ddl)
+
+    conn.executemany("INSERT INTO categories (id, name) VALUES (?, ?)", enumerate(CATEGORIES, start=1))
+    category_ids = rng.integers(1, len(CATEGORIES) + 1, products)
+    conn.executemany(
+        "INSERT INTO products (id, name, description, category_id) VALUES (?, ?, ?, ?)",
+        (
+            (i + 1, f"{CATEGORIES[c - 1]} item {i + 1}", f"Synthetic {CATEGORIES[c - 1].lower()} product #{i + 1}", int(c))
+            for i, c in enumerate(category_ids)
+        ),
+    )
+    conn.commit()
+
+    start = time.perf_counter()
+    end = pd.Timestamp.now().normalize().to_datetime64().astype("datetime64[s]")
+    columns = None
+    for offset in range(0, orders, chunk_size):
+        chunk = _orders_chunk(rng, offset, min(chunk_size, orders - offset), products, end, days)
+        if columns is None:
+            columns = list(chunk)
+            sql = f"INSERT INTO orders ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        conn.executemany(sql, zip(*(chunk[c] for c in columns)))
+        conn.commit()
+        done = offset + len(chunk["order_detail_id"])
+        log(f"  {done:,}/{orders:,} orders ({done / (time.perf_counter() - start):,.0f} rows/s)")
+    conn.close()
+    return path
+
+
+def _orders_chunk(rng, offset: int, n: int, products: int, end, days: int) -> dict:
+    """One chunk of order rows as column lists of Python values (NULLs as None)"""
+    detail_id = np.arange(offset + 1, offset + n + 1)
+    # About three line items per order
+    order_id = (detail_id - 1) // 3 + 1
+    created = end - rng.integers(0, days * 86400, n).astype("timedelta64[s]")
+    modified = created + rng.integers(0, 72 * 3600, n).astype("timedelta64[s]")
+
+    gross = np.round(rng.lognormal(4.0, 1.0, n), 2)
+    has_discount = rng.random(n) < 0.25
+    discount_percent = np.where(has_discount, rng.choice([5.0, 10.0, 15.0, 20.0, 25.0, 30.0], n), np.nan)
+    discount_amount = np.round(gross * np.nan_to_num(discount_percent) / 100, 2)
+
+    status = _pick(rng, STATUSES[0], n, STATUSES[1])
+    cancelled = status == "cancelled"
+    location = rng.integers(0, len(LOCATIONS), n)
+    names = np.char.add(np.char.add(_pick(rng, FIRST_NAMES, n).astype(str), " "), _pick(rng, LAST_NAMES, n).astype(str))
+
+    return {
+        "order_id": order_id.tolist(),
+        "date_created": _format_dates(created),
+        "date_modified": _format_dates(modified),
+        "order_code": (order_id + 100_000_000).tolist(),
+        "order_detail_id": detail_id.tolist(),
+        "product_id": rng.integers(1, products + 1, n).tolist(),
+        "gross_amount_after_tax": gross.tolist(),
+        "discount_code": _with_nulls(_pick(rng, DISCOUNT_CODES, n), ~has_discount),
+        "discount_amount": _with_nulls(discount_amount, ~has_discount),
+        "discount_percent": _with_nulls(discount_percent, ~has_discount),
+        "order_status": status.tolist(),
+        "fullname": names.tolist(),
+        "city": [LOCATIONS[i][0] for i in location],
+        "state_region": [LOCATIONS[i][1] for i in location],
+        "country": [LOCATIONS[i][2] for i in location],
+        "gateway_id": _pick(rng, GATEWAYS, n).tolist(),
+        "customer_id": rng.integers(1, max(n // 4, 1000), n).tolist(),
+        "cancel_reason": _with_nulls(_pick(rng, CANCEL_REASONS, n), ~cancelled),
+        "tax_rate_raw": np.round(rng.uniform(0.05, 0.2, n), 3).tolist(),
+        "order_source": _pick(rng, SOURCES, n).tolist(),
+        "is_free_shipping": (rng.random(n) < 0.3).astype(int).tolist(),
+    }
+
+
+def _pick(rng, values: list, n: int, p=None) -> np.ndarray:
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _with_nulls(values: np.ndarray, null_mask: np.ndarray) -> list:
+    values = values.astype(object)
+    values[null_mask] = None
+    return values.tolist()
+
+
+def _format_dates(values: np.ndarray) -> list:
+    return np.char.replace(np.datetime_as_string(values, unit="s"), "T", " ").tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--orders", type=int, help="Number of order rows")
+    group.add_argument("--scale", choices=list(SCALES), help="Named scale")
+    parser.add_argument("--out", required=True, help="SQLite file to create")
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    orders = args.orders or SCALES[args.scale]
+    start = time.perf_counter()
+    generate_database(args.out, orders, chunk_size=args.chunk_size, seed=args.seed)
+    print(f"✅ {args.out}: {orders:,} orders in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,27 @@
 import os
 from dotenv import load_dotenv
-from core.my_agent import MyVanna
+from core.my_agent import create_vanna
+from core.registry import get_registry
 load_dotenv()
 # Cấu hình Vanna
-vn = MyVanna(config={
-    "base_url": "https://vibe-agent-gateway.eternalai.org/v1",
-    "api_key": os.getenv("LLM_API_KEY"),  
-    "model": "gpt-4o-mini"
-})
\ No newline at end of file
+# VECTOR_STORE=local dùng vector store nhúng (không cần Milvus server)
+VANNA_CONFIG = {
+    # LLM_BASE_URL trỏ tới gateway khác, ví dụ mock server cục bộ (benchmarks/mock_llm_server.py)
+    "base_url": os.getenv("LLM_BASE_URL", "https://vibe-agent-gateway.eternalai.org/v1"),
+    "api_key": os.getenv("LLM_API_KEY"),
+    "model": "gpt-4o-mini",
+    "vector_store": os.getenv("VECTOR_STORE", "milvus"),
+    "local_store_path": os.getenv("LOCAL_STORE_PATH", "vector_store"),
+}
+
+def _build_vanna():
+    # Load training data trước khi agent được công bố trong registry, để không ai dùng agent còn rỗng
+    agent = create_vanna(config=VANNA_CONFIG)
+    agent.load_training_data()
+    return agent
+
+
+# Agent dùng chung trong process, chỉ khởi tạo (load embedder, kết nối vector store, training data)
+# khi dùng lần đầu hoặc khi warm-up: get_registry().warm_up("vanna")
+get_registry().register("vanna", _build_vanna)
+vn = get_registry().proxy("vanna")
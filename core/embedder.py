@@ -0,0 +1,120 @@
+import os
+import platform
+import numpy as np
+
+# Embedding inference backend for the sentence-transformers model:
+#   "torch"  default PyTorch fp32
+#   "onnx"   ONNX Runtime, fp32 export of the same weights
+#   "int8"   ONNX Runtime, dynamically quantized int8 export (variant picked for this CPU)
+# "onnx"/"int8" need sentence-transformers>=3.2 with onnxruntime and optimum; without them the
+# torch backend is used. Run benchmarks/bench_embedder.py to check recall parity before switching.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# ONNX file inside the model repo (e.g. "onnx/model_O3.onnx"); empty = default for the backend
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+# Inference threads (0 = library default: all cores). Fewer threads than cores often lowers
+# per-query latency when several requests embed at once.
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0))
+# Texts per encode() batch when bulk-loading training data
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+
+BACKENDS = ("torch", "onnx", "int8")
+
+
+def int8_onnx_file() -> str:
+    """Quantized export in the all-MiniLM-L6-v2 repo that matches this CPU's instruction set"""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512f" in flags or "avx512bw" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_qint8_avx2.onnx"
+
+
+def _cpu_flags() -> set:
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def load_embedder(model_name: str, backend: str | None = None, threads: int | None = None,
+                  onnx_file: str | None = None):
+    """
+    SentenceTransformer for `model_name` on the chosen backend (default: EMBEDDING_BACKEND).
+    All backends produce embeddings in the same space, so vectors already stored by the
+    fp32 model stay searchable. Falls back to torch if the ONNX backend can't be loaded.
+    """
+    # Imported here: sentence-transformers pulls in torch, which takes seconds to import
+    from sentence_transformers import SentenceTransformer
+
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    threads = EMBEDDING_THREADS if threads is None else threads
+    onnx_file = onnx_file if onnx_file is not None else EMBEDDING_ONNX_FILE
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {list(BACKENDS)}")
+
+    if backend in ("onnx", "int8"):
+        model_kwargs = {"file_name": onnx_file or (int8_onnx_file() if backend == "int8" else "onnx/model.onnx")}
+        try:
+            if threads:
+                import onnxruntime as ort
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = threads
+                options.inter_op_num_threads = 1
+                model_kwargs["session_options"] = options
+            model = SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+            print(f"✅ Embedder {model_name}: ONNX Runtime ({model_kwargs['file_name']})")
+            return model
+        except Exception as e:
+            print(f"❌ Error loading ONNX embedder ({e}); using PyTorch fp32")
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name)
+
+
+def recall_parity(reference, candidate, corpus: list, queries: list, k: int = 5, batch_size: int = EMBED_BATCH_SIZE) -> dict:
+    """
+    Compare a candidate embedder with the reference (fp32) one on the same corpus and queries:
+    recall@k of the candidate's top-k L2 neighbours against the reference's top-k, and the
+    cosine similarity between the two models' vectors for the same text.
+    """
+    ref_corpus = np.asarray(reference.encode(corpus, batch_size=batch_size), dtype=np.float32)
+    cand_corpus = np.asarray(candidate.encode(corpus, batch_size=batch_size), dtype=np.float32)
+    ref_queries = np.asarray(reference.encode(queries, batch_size=batch_size), dtype=np.float32)
+    cand_queries = np.asarray(candidate.encode(queries, batch_size=batch_size), dtype=np.float32)
+
+    k = min(k, len(corpus))
+    ref_top = _top_k_l2(ref_queries, ref_corpus, k)
+    cand_top = _top_k_l2(cand_queries, cand_corpus, k)
+    recalls = [len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]
+
+    vectors = np.vstack([ref_corpus, ref_queries]), np.vstack([cand_corpus, cand_queries])
+    cosine = np.sum(vectors[0] * vectors[1], axis=1) / (
+        np.linalg.norm(vectors[0], axis=1) * np.linalg.norm(vectors[1], axis=1)
+    )
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": float(np.mean(recalls)),
+        "min_recall_at_k": float(np.min(recalls)),
+        "top1_agreement": float(np.mean(ref_top[:, 0] == cand_top[:, 0])),
+        "mean_cosine": float(np.mean(cosine)),
+        "min_cosine": float(np.min(cosine)),
+    }
+
+
+def _top_k_l2(queries: np.ndarray, corpus: np.ndarray, k: int) -> np.ndarray:
+    # Squared L2 without the constant |q|^2 term, like the Milvus L2 metric ranks
+    distances = -2 * queries @ corpus.T + np.sum(corpus * corpus, axis=1)
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
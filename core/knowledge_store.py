@@ -0,0 +1,225 @@
+from vanna.base import VannaBase
+import hashlib
+import pandas as pd
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from core.embedder import EMBED_BATCH_SIZE, EMBEDDING_BACKEND, load_embedder
+from core.registry import get_registry
+
+# Knowledge types; each backend keeps them in separate partitions
+KINDS = ("ddl", "documentation", "question_sql")
+
+
+class KnowledgeStore(VannaBase):
+    """
+    Embedding, caching and bookkeeping shared by the vector store backends.
+
+    Backends call `_init_knowledge_store(config)` from their __init__ and
+    implement `_insert`, `_search_embedding`, `_all_entries` and
+    `remove_training_data`; everything else (VannaBase hooks, bulk loading,
+    query-embedding LRU, per-kind top-k) lives here.
+    """
+
+    # Longest text (UTF-8 bytes) the backend can store; None = unlimited
+    max_text_length = None
+
+    def _init_knowledge_store(self, config=None):
+        config = config or {}
+        self.embedding_model = config.get("embedding_model", "all-MiniLM-L6-v2")
+        self.embedding_backend = config.get("embedding_backend", EMBEDDING_BACKEND)
+        # One model per process, shared by every agent (and loaded only when first needed)
+        self.embedder = get_registry().get_or_create(
+            f"embedder:{self.embedding_model}:{self.embedding_backend}",
+            lambda: load_embedder(self.embedding_model, backend=self.embedding_backend)
+        )
+        self.embed_batch_size = int(config.get("embed_batch_size", EMBED_BATCH_SIZE))
+        self.insert_batch_size = int(config.get("insert_batch_size", 1000))
+        self.query_cache_size = int(config.get("query_embedding_cache_size", 256))
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.top_k = {kind: int(config.get(f"{kind}_top_k", 3)) for kind in KINDS}
+
+    def _embed(self, text: str):
+        return self.embedder.encode([text])[0].tolist()
+
+    def _embed_query(self, question: str):
+        """Embed a question, memoized in a bounded LRU cache"""
+        with self._query_cache_lock:
+            emb = self._query_cache.get(question)
+            if emb is not None:
+                self._query_cache.move_to_end(question)
+                return emb
+        emb = self._embed(question)
+        with self._query_cache_lock:
+            self._query_cache[question] = emb
+            self._query_cache.move_to_end(question)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return emb
+
+    def generate_embedding(self, text: str) -> list:
+        return self._embed(text)
+
+    def add_ddl(self, ddl: str, **kwargs) -> str:
+        return self._add_entry("ddl", ddl)
+
+    def add_documentation(self, doc: str, **kwargs) -> str:
+        return self._add_entry("documentation", doc)
+
+    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
+        return self._add_entry("question_sql", f"{question} => {sql}")
+
+    def _add_entry(self, kind: str, text: str) -> str:
+        emb = self._embed(text)
+        id_str = str(uuid.uuid4())
+        self._insert(kind, [id_str], [text], [emb])
+        return id_str
+
+    def _insert(self, kind: str, ids: list, texts: list, embs: list):
+        raise NotImplementedError
+
+    def _flush(self):
+        pass
+
+    def add_many(self, entries: list, batch_size: int | None = None, skip_existing: bool = True) -> list:
+        """
+        Bulk-insert training entries shaped like MyVanna.training_data items:
+        {"ddl": ...}, {"documentation": ...} or {"question": ..., "sql": ...}.
+        Texts are embedded in batches, written with one insert per
+        `insert_batch_size` rows and flushed once at the end. With `skip_existing`,
+        texts already in the store (or repeated in `entries`) are not inserted again,
+        so reloading the same training set does not fill the store with duplicates.
+        Texts longer than the backend's `max_text_length` are reported and skipped.
+        """
+        texts_by_kind = {kind: [] for kind in KINDS}
+        oversize = []
+        for entry in entries:
+            text = self._entry_text(entry)
+            if not text:
+                continue
+            if self.max_text_length and len(text.encode("utf-8")) > self.max_text_length:
+                oversize.append(text)
+                continue
+            texts_by_kind[self._entry_kind(entry)].append(text)
+        if oversize:
+            print(f"❌ Skipped {len(oversize)} entries longer than {self.max_text_length} bytes: "
+                  + ", ".join(repr(text[:40]) for text in oversize[:3]))
+
+        skipped = 0
+        if skip_existing:
+            seen = self._existing_texts([text for texts in texts_by_kind.values() for text in texts])
+            for kind, texts in texts_by_kind.items():
+                unique = []
+                for text in texts:
+                    if text in seen:
+                        skipped += 1
+                        continue
+                    seen.add(text)
+                    unique.append(text)
+                texts_by_kind[kind] = unique
+
+        insert_batch_size = batch_size or self.insert_batch_size
+        start = time.perf_counter()
+        ids = []
+        try:
+            for kind, texts in texts_by_kind.items():
+                for i in range(0, len(texts), insert_batch_size):
+                    chunk = texts[i:i + insert_batch_size]
+                    embs = self.embedder.encode(chunk, batch_size=self.embed_batch_size).tolist()
+                    chunk_ids = [str(uuid.uuid4()) for _ in chunk]
+                    self._insert(kind, chunk_ids, chunk, embs)
+                    ids.extend(chunk_ids)
+        finally:
+            # Rows inserted before a failure are still made durable
+            if ids:
+                self._flush()
+        elapsed = time.perf_counter() - start
+        rows_per_sec = len(ids) / elapsed if elapsed > 0 else 0.0
+        self.last_bulk_stats = {"rows": len(ids), "seconds": elapsed, "rows_per_sec": rows_per_sec,
+                                "skipped": skipped, "oversize": len(oversize)}
+        print(f"✅ Inserted {len(ids)} entries in {elapsed:.2f}s ({rows_per_sec:.1f} rows/s), {skipped} duplicates skipped")
+        return ids
+
+    def _existing_texts(self, texts: list) -> set:
+        """The subset of `texts` already stored; backends can override this with a targeted lookup"""
+        wanted = set(texts)
+        if not wanted:
+            return set()
+        return {entry.get("text") for entry in self._all_entries()} & wanted
+
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _entry_text(entry: dict) -> str | None:
+        if "question" in entry and "sql" in entry:
+            return f"{entry['question']} => {entry['sql']}"
+        if "ddl" in entry:
+            return entry["ddl"]
+        if "documentation" in entry:
+            return entry["documentation"]
+        return None
+
+    @staticmethod
+    def _entry_kind(entry: dict) -> str:
+        if "question" in entry and "sql" in entry:
+            return "question_sql"
+        if "ddl" in entry:
+            return "ddl"
+        return "documentation"
+
+    def _search(self, question: str, kind: str, top_k: int | None = None) -> list:
+        return self._search_embedding(self._embed_query(question), kind, top_k or self.top_k[kind])
+
+    def _search_embedding(self, emb, kind: str, limit: int) -> list:
+        raise NotImplementedError
+
+    def get_related_ddl(self, question: str, **kwargs) -> list:
+        return self._search(question, "ddl", kwargs.get("top_k"))
+
+    def get_related_documentation(self, question: str, **kwargs) -> list:
+        return self._search(question, "documentation", kwargs.get("top_k"))
+
+    def get_similar_question_sql(self, question: str, **kwargs) -> list:
+        return self._search(question, "question_sql", kwargs.get("top_k"))
+
+    def get_related_context(self, question: str, **kwargs) -> dict:
+        """
+        Answer the DDL, documentation and question->SQL lookups for one question
+        with a single embedding. `top_k` may be a dict overriding the per-kind limits.
+        """
+        emb = self._embed_query(question)
+        top_k = {**self.top_k, **(kwargs.get("top_k") or {})}
+        return {kind: self._search_embedding(emb, kind, top_k[kind]) for kind in KINDS}
+
+    def _all_entries(self) -> list:
+        """Return every stored entry as {"id", "text", "kind"} dicts"""
+        raise NotImplementedError
+
+    def get_training_data(self) -> pd.DataFrame:
+        try:
+            data = []
+            for result in self._all_entries():
+                text = result.get('text', '')
+                kind = result.get('kind') or ('question_sql' if ' => ' in text else 'documentation')
+                if kind == 'question_sql':
+                    question, sql = text.split(' => ', 1)
+                    data.append({
+                        'id': result.get('id', ''),
+                        'question': question,
+                        'sql': sql,
+                        'type': 'question_sql'
+                    })
+                else:
+                    data.append({
+                        'id': result.get('id', ''),
+                        'text': text,
+                        'type': kind
+                    })
+            return pd.DataFrame(data)
+        except Exception as e:
+            print(f"Error getting training data: {e}")
+            return pd.DataFrame()
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from core import tracing
+from core.llm_cache import completion_key, get_completion_cache
+from core.prompt_context import count_tokens
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(RuntimeError):
+    """Non-200 response from the chat completions endpoint (after retries)"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"HTTP {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class LLMClient:
+    """
+    Client for an OpenAI-compatible /chat/completions endpoint.
+
+    Keeps one pooled keep-alive session per client, retries 429/5xx and
+    connection errors with jittered exponential backoff (honoring
+    Retry-After), and answers repeated requests from the completion cache.
+    """
+
+    def __init__(self, base_url: str, api_key: str | None = None, timeout: float = 100,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 pool_size: int = 10, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _backoff(self, attempt: int, response=None) -> float:
+        return _backoff_delay(attempt, self.backoff_base, self.backoff_max, response)
+
+    def post(self, payload: dict, timeout: float | None = None, stream: bool = False,
+             span=tracing.NOOP_SPAN) -> requests.Response:
+        """POST a chat completions payload, retrying transient failures; returns the final response (attempts go on `span`)"""
+        url = f"{self.base_url}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            span.set(attempts=attempt + 1)
+            try:
+                response = self.session.post(
+                    url,
+                    headers=self._headers(),
+                    json=payload,
+                    timeout=timeout or self.timeout,
+                    stream=stream
+                )
+            except requests.exceptions.ConnectionError:
+                # Includes ConnectTimeout. A read timeout is not retried: the server may still be
+                # working on the request, and each retry would wait the full timeout again
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                response.close()
+                time.sleep(delay)
+                continue
+            return response
+
+    def chat(self, messages: list, model: str, timeout: float | None = None, cache=None, cache_if=None, **params) -> str:
+        """
+        Return the assistant message content for `messages`.
+        `cache=False` bypasses the cache; `cache_if(content)` can veto caching a response.
+        Raises LLMError for non-200 responses and requests exceptions for transport failures.
+        """
+        with tracing.span("llm.chat", model=model) as span:
+            cache = self.cache if cache is None else (cache or None)
+            cache_key = None
+            if cache is not None:
+                cache_key = completion_key(model, messages, **params)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    span.set(cache="hit")
+                    return cached
+
+            response = self.post({"model": model, "messages": messages, **params}, timeout=timeout, span=span)
+            span.set(status_code=response.status_code)
+            content, usage = _parse_completion(response)
+            _record_tokens(span, messages, content, usage)
+            if cache_key is not None and (cache_if is None or cache_if(content)):
+                cache.set(cache_key, content)
+            return content
+
+    def stream_chat(self, messages: list, model: str, timeout: float | None = None, cache=None, **params):
+        """
+        Like chat(), but yields content tokens as the server sends them
+        (server-sent events with "stream": true). A cache hit yields the whole
+        cached completion at once; a fully received stream is cached.
+        """
+        # Not activated: the consumer runs between yields, and its spans aren't part of this call
+        with tracing.span("llm.stream", activate=False, model=model) as span:
+            cache = self.cache if cache is None else (cache or None)
+            cache_key = None
+            if cache is not None:
+                cache_key = completion_key(model, messages, **params)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    span.set(cache="hit")
+                    yield cached
+                    return
+
+            start = time.perf_counter()
+            response = self.post({"model": model, "messages": messages, "stream": True, **params}, timeout=timeout, stream=True, span=span)
+            span.set(status_code=response.status_code)
+            try:
+                if response.status_code != 200:
+                    raise LLMError(response.status_code, response.text)
+                # text/event-stream without a charset would otherwise be decoded as latin-1
+                response.encoding = "utf-8"
+                parts = []
+                for token in _iter_sse_tokens(response.iter_lines(decode_unicode=True)):
+                    if not parts:
+                        span.set(first_token_seconds=time.perf_counter() - start)
+                    parts.append(token)
+                    yield token
+                _record_tokens(span, messages, "".join(parts))
+                if cache_key is not None and parts:
+                    cache.set(cache_key, "".join(parts))
+            finally:
+                response.close()
+
+
+def _iter_sse_tokens(lines):
+    """Yield delta content from OpenAI-style `data: {...}` server-sent event lines"""
+    for line in lines:
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise RuntimeError(f"LLM API Error: {chunk['error']}")
+        for choice in chunk.get("choices", []):
+            token = (choice.get("delta") or {}).get("content")
+            if token:
+                yield token
+
+
+class AsyncLLMClient:
+    """
+    asyncio counterpart of LLMClient backed by httpx.AsyncClient.
+
+    At most `max_concurrency` requests are in flight at once; retries, the
+    completion cache and error types behave like LLMClient. The client is
+    bound to the event loop it is first used in.
+    """
+
+    def __init__(self, base_url: str, api_key: str | None = None, timeout: float = 100,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 max_concurrency: int = 8, cache=None):
+        import httpx
+
+        self._httpx = httpx
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache if cache is not None else get_completion_cache()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    _headers = LLMClient._headers
+
+    async def post(self, payload: dict, timeout: float | None = None, span=tracing.NOOP_SPAN):
+        """POST a chat completions payload, retrying transient failures; returns the final httpx.Response"""
+        url = f"{self.base_url}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            span.set(attempts=attempt + 1)
+            try:
+                async with self.semaphore:
+                    response = await self.client.post(
+                        url,
+                        headers=self._headers(),
+                        json=payload,
+                        timeout=timeout or self.timeout
+                    )
+            except self._httpx.TransportError as e:
+                # Like LLMClient.post: connection failures are retried, read/write/pool timeouts are not
+                timed_out = isinstance(e, self._httpx.TimeoutException) and not isinstance(e, self._httpx.ConnectTimeout)
+                if timed_out or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(_backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                await asyncio.sleep(_backoff_delay(attempt, self.backoff_base, self.backoff_max, response))
+                continue
+            return response
+
+    async def chat(self, messages: list, model: str, timeout: float | None = None, cache=None, cache_if=None, **params) -> str:
+        """Async version of LLMClient.chat"""
+        with tracing.span("llm.chat", model=model) as span:
+            cache = self.cache if cache is None else (cache or None)
+            cache_key = None
+            if cache is not None:
+                cache_key = completion_key(model, messages, **params)
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    span.set(cache="hit")
+                    return cached
+
+            response = await self.post({"model": model, "messages": messages, **params}, timeout=timeout, span=span)
+            span.set(status_code=response.status_code)
+            content, usage = _parse_completion(response)
+            _record_tokens(span, messages, content, usage)
+            if cache_key is not None and (cache_if is None or cache_if(content)):
+                cache.set(cache_key, content)
+            return content
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _parse_completion(response) -> tuple:
+    """(assistant message, usage dict or None) from a requests/httpx response, raising on errors"""
+    if response.status_code != 200:
+        raise LLMError(response.status_code, response.text)
+    if not response.text.strip():
+        raise LLMError(response.status_code, "Empty response from API")
+    result = response.json()
+    if "choices" not in result or not result["choices"]:
+        if "error" in result:
+            raise RuntimeError(f"LLM API Error: {result['error']}")
+        raise RuntimeError(f"Invalid LLM response: {result}")
+    return result["choices"][0]["message"]["content"], result.get("usage")
+
+
+def _record_tokens(span, messages: list, content: str, usage: dict | None = None):
+    """Token counts on an LLM span: from the server's usage block, else estimated"""
+    if not span.recording:
+        return
+    usage = usage or {}
+    span.set(
+        prompt_tokens=usage.get("prompt_tokens") or sum(count_tokens(m.get("content") or "") for m in messages),
+        completion_tokens=usage.get("completion_tokens") or count_tokens(content),
+    )
+
+
+def _backoff_delay(attempt: int, base: float, cap: float, response=None) -> float:
+    if response is not None:
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, cap)
+    # Full jitter: uniform in [0, base * 2^attempt]
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(base_url: str, api_key: str | None = None) -> LLMClient:
+    """
+    Process-wide client per (base_url, api_key), so connections are reused across
+    modules and Streamlit reruns. Retry policy comes from LLM_MAX_RETRIES and LLM_TIMEOUT.
+    """
+    key = (base_url.rstrip("/"), api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = LLMClient(
+                base_url,
+                api_key=api_key,
+                timeout=float(os.getenv("LLM_TIMEOUT", 100)),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", 3)),
+            )
+            _clients[key] = client
+        return client
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import numpy as np
+from core.knowledge_store import KnowledgeStore, KINDS
+
+
+class LocalVectorDB(KnowledgeStore):
+    """
+    In-process vector store: no server, exact (brute-force) L2 search with NumPy.
+
+    Each knowledge kind is kept in its own pair of files under `local_store_path`:
+    `<kind>.f32` holds the embeddings as a raw float32 matrix that is
+    memory-mapped for search, and `<kind>.jsonl` holds one {"id", "text"}
+    record per row plus {"id", "deleted": true} tombstones. Both files are
+    append-only.
+    """
+
+    def __init__(self, config=None):
+        self._init_knowledge_store(config)
+        self.path = (config or {}).get("local_store_path", "vector_store")
+        os.makedirs(self.path, exist_ok=True)
+        self.dim = self.embedder.get_sentence_embedding_dimension()
+        self._lock = threading.Lock()
+        self._kinds = {kind: self._load(kind) for kind in KINDS}
+
+    def _files(self, kind: str):
+        return os.path.join(self.path, f"{kind}.f32"), os.path.join(self.path, f"{kind}.jsonl")
+
+    def _load(self, kind: str) -> dict:
+        vec_path, meta_path = self._files(kind)
+        records, deleted = [], set()
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    rec = json.loads(line)
+                    if rec.get("deleted"):
+                        deleted.add(rec["id"])
+                    else:
+                        records.append(rec)
+
+        row_bytes = 4 * self.dim
+        n_vectors = os.path.getsize(vec_path) // row_bytes if os.path.exists(vec_path) else 0
+        n = min(len(records), n_vectors)
+        records = records[:n]
+        if os.path.exists(vec_path) and os.path.getsize(vec_path) != n * row_bytes:
+            # Drop a partially written tail so future appends stay aligned with the metadata
+            os.truncate(vec_path, n * row_bytes)
+
+        state = {
+            "ids": [rec["id"] for rec in records],
+            "texts": [rec["text"] for rec in records],
+            "alive": np.array([rec["id"] not in deleted for rec in records], dtype=bool),
+        }
+        self._map(kind, state, n)
+        return state
+
+    def _map(self, kind: str, state: dict, n: int):
+        vec_path, _ = self._files(kind)
+        if n:
+            matrix = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        else:
+            matrix = np.empty((0, self.dim), dtype=np.float32)
+        state["matrix"] = matrix
+        state["norms"] = np.einsum("ij,ij->i", matrix, matrix)
+
+    def _insert(self, kind: str, ids: list, texts: list, embs: list):
+        vecs = np.asarray(embs, dtype=np.float32).reshape(-1, self.dim)
+        vec_path, meta_path = self._files(kind)
+        with self._lock:
+            state = self._kinds[kind]
+            with open(vec_path, "ab") as f:
+                f.write(vecs.tobytes())
+            with open(meta_path, "a", encoding="utf-8") as f:
+                for id_str, text in zip(ids, texts):
+                    f.write(json.dumps({"id": id_str, "text": text}, ensure_ascii=False) + "\n")
+            old_norms = state["norms"]
+            state["ids"].extend(ids)
+            state["texts"].extend(texts)
+            state["alive"] = np.concatenate([state["alive"], np.ones(len(ids), dtype=bool)])
+            matrix = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(len(state["ids"]), self.dim))
+            state["matrix"] = matrix
+            state["norms"] = np.concatenate([old_norms, np.einsum("ij,ij->i", vecs, vecs)])
+
+    def _search_embedding(self, emb, kind: str, limit: int) -> list:
+        state = self._kinds[kind]
+        with self._lock:
+            matrix, norms, alive, texts = state["matrix"], state["norms"], state["alive"], state["texts"]
+        k = min(limit, int(alive.sum()))
+        if k <= 0:
+            return []
+        query = np.asarray(emb, dtype=np.float32)
+        # Squared L2 distance without the constant ||q||^2 term
+        dists = norms - 2.0 * (matrix @ query)
+        dists[~alive] = np.inf
+        idx = np.argpartition(dists, k - 1)[:k]
+        idx = idx[np.argsort(dists[idx])]
+        return [texts[i] for i in idx]
+
+    def _all_entries(self) -> list:
+        entries = []
+        for kind, state in self._kinds.items():
+            for id_str, text, alive in zip(state["ids"], state["texts"], state["alive"]):
+                if alive:
+                    entries.append({"id": id_str, "text": text, "kind": kind})
+        return entries
+
+    def remove_training_data(self, id: str) -> bool:
+        try:
+            with self._lock:
+                for kind, state in self._kinds.items():
+                    if id not in state["ids"]:
+                        continue
+                    _, meta_path = self._files(kind)
+                    with open(meta_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"id": id, "deleted": True}) + "\n")
+                    alive = state["alive"].copy()
+                    alive[state["ids"].index(id)] = False
+                    state["alive"] = alive
+                    return True
+            return False
+        except Exception as e:
+            print(f"Error removing training data: {e}")
+            return False
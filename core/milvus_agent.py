@@ -0,0 +1,10 @@
+from core.adapter import DBAdapter
+from core.milvus_store import MilvusVectorDB
+from core.my_agent import VannaAgent
+
+
+class MyVanna(MilvusVectorDB, VannaAgent):
+    """Agent backed by a Milvus server"""
+    def __init__(self, config, db_adapter: DBAdapter | None = None):
+        MilvusVectorDB.__init__(self, config=config)
+        VannaAgent.__init__(self, config, db_adapter)
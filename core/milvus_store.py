@@ -1,100 +1,135 @@
-from vanna.base import VannaBase
 from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
-from sentence_transformers import SentenceTransformer
-import pandas as pd
-import uuid
+from core.knowledge_store import KnowledgeStore, KINDS
+from core.registry import get_registry
 
-class MilvusVectorDB(VannaBase):
-    def __init__(self, config=None):
-        self.collection_name = "vanna_knowledge"
-        self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
-        host = (config or {}).get("milvus_host", "localhost")
-        port = (config or {}).get("milvus_port", "19530")
-        connections.connect(host=host, port=port)
+# VARCHAR limit for stored texts (bytes); Milvus allows up to 65535
+TEXT_MAX_LENGTH = 65535
+
+def open_collection(host: str, port: str, collection_name: str) -> Collection:
+    """Connect to Milvus, create the collection (and its per-kind partitions) if needed and load it"""
+    alias = f"{host}:{port}"
+    connections.connect(alias=alias, host=host, port=port)
 
-        # Define schema for collection
-        fields = [
-            FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=36),
-            FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=1000),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
-        ]
-        schema = CollectionSchema(fields, description="Vanna knowledge base")
-        if self.collection_name not in utility.list_collections():
-            self.collection = Collection(self.collection_name, schema=schema)
-            self.collection.create_index(field_name="embedding", index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}})
-        else:
-            self.collection = Collection(self.collection_name)
-        self.collection.load()
+    # Define schema for collection
+    fields = [
+        FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=36),
+        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=TEXT_MAX_LENGTH),
+        FieldSchema(name="kind", dtype=DataType.VARCHAR, max_length=32),
+        # sha256 of the text, so duplicate checks can look up exact texts with an `in` expression
+        FieldSchema(name="text_hash", dtype=DataType.VARCHAR, max_length=64),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=384)
+    ]
+    schema = CollectionSchema(fields, description="Vanna knowledge base")
+    if collection_name not in utility.list_collections(using=alias):
+        collection = Collection(collection_name, schema=schema, using=alias)
+        collection.create_index(field_name="embedding", index_params={"metric_type": "L2", "index_type": "IVF_FLAT", "params": {"nlist": 128}})
+    else:
+        collection = Collection(collection_name, using=alias)
 
-    def _embed(self, text: str):
-        return self.embedder.encode([text])[0].tolist()
+    if "kind" in [f.name for f in collection.schema.fields]:
+        for kind in KINDS:
+            if not collection.has_partition(kind):
+                collection.create_partition(kind)
+    else:
+        print(f"⚠️ Collection '{collection_name}' has no 'kind' field; "
+              "drop and retrain it to enable typed partitions and per-type search")
+    collection.load()
+    return collection
 
-    def generate_embedding(self, text: str) -> list:
-        return self._embed(text)
 
-    def add_ddl(self, ddl: str, **kwargs) -> str:
-        return self._add_entry(ddl)
+class MilvusVectorDB(KnowledgeStore):
+    def __init__(self, config=None):
+        self.collection_name = "vanna_knowledge"
+        self._init_knowledge_store(config)
+        host = (config or {}).get("milvus_host", "localhost")
+        port = (config or {}).get("milvus_port", "19530")
+        # The connection and the loaded collection are shared by every agent in the process
+        self.collection = get_registry().get_or_create(
+            f"milvus:{host}:{port}/{self.collection_name}",
+            lambda: open_collection(host, port, self.collection_name)
+        )
+        # Collections created before the "kind" / "text_hash" fields existed keep working without them
+        fields = {f.name: f for f in self.collection.schema.fields}
+        self.typed = "kind" in fields
+        self.hashed = "text_hash" in fields
+        self.max_text_length = int(fields["text"].params.get("max_length", TEXT_MAX_LENGTH))
 
-    def add_documentation(self, doc: str, **kwargs) -> str:
-        return self._add_entry(doc)
+    def _insert(self, kind: str, ids: list, texts: list, embs: list):
+        columns = {"id": ids, "text": texts, "kind": [kind] * len(ids), "embedding": embs}
+        if self.hashed:
+            columns["text_hash"] = [self._text_hash(text) for text in texts]
+        data = [columns[f.name] for f in self.collection.schema.fields]
+        self.collection.insert(data, partition_name=kind if self.typed else None)
 
-    def add_question_sql(self, question: str, sql: str, **kwargs) -> str:
-        return self._add_entry(f"{question} => {sql}")
+    def _existing_texts(self, texts: list, chunk_size: int = 500) -> set:
+        """Stored texts among `texts`: looked up by hash, or paged through on collections without one"""
+        wanted = set(texts)
+        if not wanted:
+            return set()
+        found = set()
+        try:
+            if self.hashed:
+                hashes = sorted({self._text_hash(text) for text in wanted})
+                for i in range(0, len(hashes), chunk_size):
+                    chunk = ", ".join(f'"{h}"' for h in hashes[i:i + chunk_size])
+                    rows = self.collection.query(expr=f"text_hash in [{chunk}]", output_fields=["text"])
+                    found.update(row["text"] for row in rows)
+            else:
+                iterator = self.collection.query_iterator(batch_size=1000, expr="id != ''", output_fields=["text"])
+                try:
+                    while True:
+                        rows = iterator.next()
+                        if not rows:
+                            break
+                        found.update(row["text"] for row in rows)
+                finally:
+                    iterator.close()
+        except Exception as e:
+            print(f"Error checking for existing training data: {e}")
+        return found & wanted
 
-    def _add_entry(self, text: str) -> str:
-        emb = self._embed(text)
-        id_str = str(uuid.uuid4())
-        self.collection.insert([[id_str], [text], [emb]])
-        return id_str
+    def _flush(self):
+        self.collection.flush()
 
-    def _search(self, question: str) -> list:
-        emb = self._embed(question)
+    def _search_embedding(self, emb, kind: str, limit: int, _async: bool = False):
         results = self.collection.search(
             data=[emb],
             anns_field="embedding",
             param={"metric_type": "L2", "params": {"nprobe": 10}},
-            limit=3,
-            output_fields=["text"]
+            limit=limit,
+            output_fields=["text"],
+            partition_names=[kind] if self.typed else None,
+            _async=_async
         )
+        if _async:
+            return results
+        return self._hit_texts(results)
+
+    @staticmethod
+    def _hit_texts(results) -> list:
         # Each result in results[0] is a Hit object
         return [hit.get("text", "") for hit in results[0]]
 
-    def get_related_ddl(self, question: str, **kwargs) -> list:
-        return self._search(question)
-
-    def get_related_documentation(self, question: str, **kwargs) -> list:
-        return self._search(question)
+    def get_related_context(self, question: str, **kwargs) -> dict:
+        """
+        Answer the DDL, documentation and question->SQL lookups for one question
+        with a single embedding. The per-partition searches are issued
+        concurrently and gathered, so the cost is one round trip, not three.
+        `top_k` may be a dict overriding the per-kind limits.
+        """
+        emb = self._embed_query(question)
+        top_k = {**self.top_k, **(kwargs.get("top_k") or {})}
+        if not self.typed:
+            hits = self._search_embedding(emb, "ddl", max(top_k.values()))
+            return {kind: hits[:top_k[kind]] for kind in KINDS}
+        futures = {kind: self._search_embedding(emb, kind, top_k[kind], _async=True) for kind in KINDS}
+        return {kind: self._hit_texts(future.result()) for kind, future in futures.items()}
 
-    def get_similar_question_sql(self, question: str, **kwargs) -> list:
-        return self._search(question)
-
-    def get_training_data(self) -> pd.DataFrame:
-        try:
-            results = self.collection.query(
-                expr="id != ''",
-                output_fields=["id", "text"]
-            )
-            data = []
-            for result in results:
-                text = result.get('text', '')
-                if ' => ' in text:
-                    question, sql = text.split(' => ', 1)
-                    data.append({
-                        'id': result.get('id', ''),
-                        'question': question,
-                        'sql': sql,
-                        'type': 'question_sql'
-                    })
-                else:
-                    data.append({
-                        'id': result.get('id', ''),
-                        'text': text,
-                        'type': 'documentation'
-                    })
-            return pd.DataFrame(data)
-        except Exception as e:
-            print(f"Error getting training data from Milvus: {e}")
-            return pd.DataFrame()
+    def _all_entries(self) -> list:
+        return self.collection.query(
+            expr="id != ''",
+            output_fields=["id", "text", "kind"] if self.typed else ["id", "text"]
+        )
 
     def remove_training_data(self, id: str) -> bool:
         try:
@@ -1,16 +1,39 @@
+import asyncio
+import importlib
 import os
+import threading
+import weakref
 import requests
 import pandas as pd
+from core import tracing
 from core.adapter import DBAdapter
+from core.schema_catalog import schema_catalog
 from vanna.base import VannaBase
-from core.milvus_store import MilvusVectorDB
+from core.local_store import LocalVectorDB
+from core.llm_cache import get_completion_cache
+from core.llm_client import AsyncLLMClient, LLMError, get_llm_client
+from core.prompt_context import assemble_context, rank_by_overlap
 import json
 import re
 
-class MyVanna(MilvusVectorDB, VannaBase):
+async def _close_with_loop(client: AsyncLLMClient):
+    """
+    Started once per client; the loop finalizes it in shutdown_asyncgens() (asyncio.run does so
+    before closing the loop), which closes the client's connection pool while the loop still runs.
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+class VannaAgent(VannaBase):
+    """
+    SQL generation, LLM calls and training bookkeeping. Combined with a vector
+    store backend (MilvusVectorDB, LocalVectorDB) to form a complete agent.
+    """
     def __init__(self, config, db_adapter: DBAdapter | None = None):
         self.training_data = [] 
-        MilvusVectorDB.__init__(self, config=config)
         VannaBase.__init__(self)
         if config is None:
             raise ValueError("Config must include base_url, api_key, model, and milvus settings")
@@ -23,6 +46,16 @@ class MyVanna(MilvusVectorDB, VannaBase):
         self.api_key = config["api_key"]
         self.model = config["model"]
         self.db_adapter = db_adapter
+        # Pass "completion_cache": None in config to disable caching for this agent
+        self.completion_cache = config["completion_cache"] if "completion_cache" in config else get_completion_cache()
+        self.llm_client = get_llm_client(self.base_url, self.api_key)
+        self.llm_timeout = float(config.get("llm_timeout", 100))
+        self.llm_max_concurrency = int(config.get("llm_max_concurrency", os.getenv("LLM_MAX_CONCURRENCY", 8)))
+        self.prompt_token_budget = int(config.get("prompt_token_budget", 4000))
+        self.last_context = None
+        # {event loop: (AsyncLLMClient, closer)}; entries go away with their loop
+        self._async_llm_clients = weakref.WeakKeyDictionary()
+        self._async_llm_lock = threading.Lock()
 
     def run_sql(self, sql: str) -> pd.DataFrame:
         """Open a new connection per-thread to execute SQL safely"""
@@ -55,54 +88,59 @@ class MyVanna(MilvusVectorDB, VannaBase):
         if not self.db_adapter or not table_name:
             return ""
         try:
-            df = self.db_adapter.run_sql(f"PRAGMA table_info({table_name})")
-            if df.empty:
+            columns = schema_catalog.get_tables(self.db_adapter).get(table_name)
+            if not columns:
                 return f"Table {table_name} not found."
             schema = f"Table: {table_name}\nColumns:\n"
-            for _, row in df.iterrows():
-                schema += f"  - {row['name']}: {row['type']}\n"
+            for col_name, col_type in columns:
+                schema += f"  - {col_name}: {col_type}\n"
             return schema
         except Exception as e:
             print(f"Error extracting schema: {e}")
             return ""
 
+    @tracing.traced("schema")
     def extract_all_tables_schema(self) -> str:
-        """Extract schema for all tables in the database"""
+        """Extract schema for all tables in the database (served from the schema catalog cache)"""
         if not self.db_adapter:
             return ""
         try:
-            # Get all table names
-            df_tables = self.db_adapter.run_sql("SELECT name FROM sqlite_master WHERE type='table'")
-            if df_tables.empty:
-                return "No tables found in database."
-            
-            all_schema = "Database Schema:\n"
-            for _, table_row in df_tables.iterrows():
-                table_name = str(table_row['name'])
-                table_schema = self.extract_table_schema(table_name)
-                if table_schema:
-                    all_schema += f"\n{table_schema}\n"
-            
+            all_schema = schema_catalog.describe(self.db_adapter)
+            tracing.current_span().set(tables=len(schema_catalog.get_tables(self.db_adapter)), chars=len(all_schema))
             return all_schema
         except Exception as e:
             print(f"Error extracting all tables schema: {e}")
             return ""
 
+    @tracing.traced("sql.generate")
     def generate_sql(self, question: str, table_name: str | None = None, **kwargs) -> str:
+        prompt = self._build_sql_prompt(question)
+        response = self.submit_prompt(prompt)
+        return self._parse_sql_response(response)
+
+    @tracing.traced("sql.generate")
+    async def agenerate_sql(self, question: str, table_name: str | None = None, **kwargs) -> str:
+        """Async version of generate_sql; the LLM call runs on the event loop"""
+        prompt = await asyncio.to_thread(self._build_sql_prompt, question)
+        response = await self.asubmit_prompt(prompt)
+        return self._parse_sql_response(response)
+
+    @tracing.traced("prompt.build")
+    def _build_sql_prompt(self, question: str) -> list:
         # Get schema for all tables instead of just one table
         print(f"🧾 Using schema for all tables in database")
         schema = self.extract_all_tables_schema()
         print("📄 Schema used in prompt:")
         print(schema)
 
-        training_context = f"-- Database schema:\n{schema}\n\n"
-        for item in self.training_data:
-            if "question" in item and "sql" in item:
-                training_context += f"Q: {item['question']}\nA: {item['sql']}\n\n"
-            elif "ddl" in item:
-                training_context += f"-- Schema definition:\n{item['ddl']}\n\n"
-            elif "documentation" in item:
-                training_context += f"-- Documentation:\n{item['documentation']}\n\n"
+        # Only the training items relevant to this question, within the token budget
+        context = assemble_context(schema, self.retrieve_context_items(question), self.prompt_token_budget)
+        self.last_context = context
+        print(f"📚 Context: {len(context['items'])} items, {context['total_tokens']}/{context['budget']} tokens"
+              f" ({len(context['dropped'])} dropped for budget)")
+        tracing.current_span().set(context_items=len(context['items']), context_tokens=context['total_tokens'],
+                                   dropped_items=len(context['dropped']))
+        training_context = context["text"]
 
         system_msg = """You are an expert SQL assistant that generates SQL from natural language questions. 
 
@@ -130,19 +168,62 @@ Use the database schema provided to understand table structures and relationship
             self.system_message(system_msg),
             self.user_message(f"Use the following context to generate the SQL query:\n{training_context}\nNow answer this question:\n{question}\n\nPlease provide:\n1. The SQL query (in a code block)\n2. A brief explanation of your reasoning and how you mapped the question to the SQL (in plain text, after the code block)")
         ]
-        response = self.submit_prompt(prompt)
+        return prompt
+
+    def _parse_sql_response(self, response: str) -> str:
         # Extract SQL and reasoning
-        import re
         sql_blocks = re.findall(r"```sql(.*?)```", response, re.DOTALL)
         sql_clean = sql_blocks[0].strip() if sql_blocks else response.strip()
         reasoning = re.sub(r"```sql.*?```", "", response, flags=re.DOTALL).strip()
         self.last_reasoning = reasoning
         return sql_clean
 
+    @tracing.traced("retrieval")
+    def retrieve_context_items(self, question: str) -> list:
+        """
+        Top-k question->SQL examples, documentation and DDL relevant to the question, in prompt
+        priority order. Uses the vector store; falls back to ranking the in-memory training data.
+        """
+        try:
+            related = self.get_related_context(question)
+        except Exception as e:
+            print(f"Error retrieving context from vector store: {e}")
+            related = {}
+
+        items = []
+        for text in related.get("question_sql", []):
+            q, _, sql = text.partition(" => ")
+            items.append({"kind": "question_sql", "question": q, "sql": sql})
+        for text in related.get("documentation", []):
+            items.append({"kind": "documentation", "text": text})
+        for text in related.get("ddl", []):
+            items.append({"kind": "ddl", "text": text})
+        if items:
+            tracing.current_span().set(items=len(items), source="vector_store")
+            return items
+
+        candidates = {"question_sql": [], "documentation": [], "ddl": []}
+        for item in self.training_data:
+            if "question" in item and "sql" in item:
+                candidates["question_sql"].append({"kind": "question_sql", "question": item["question"], "sql": item["sql"]})
+            elif "ddl" in item:
+                candidates["ddl"].append({"kind": "ddl", "text": item["ddl"]})
+            elif "documentation" in item:
+                candidates["documentation"].append({"kind": "documentation", "text": item["documentation"]})
+        for kind, kind_items in candidates.items():
+            ranked = rank_by_overlap(question, kind_items, lambda i: i.get("question") or i.get("text", ""))
+            items.extend(ranked[:self.top_k[kind]])
+        tracing.current_span().set(items=len(items), source="training_data")
+        return items
+
+    def get_last_context(self):
+        return self.last_context
+
     def get_last_reasoning(self):
         return getattr(self, 'last_reasoning', None)
 
 
+    @tracing.traced("ask")
     def ask(self, question: str, **kwargs):
         try:
             table_name = kwargs.get("table_name")
@@ -166,6 +247,31 @@ Use the database schema provided to understand table structures and relationship
             print(f"Error in ask method: {e}")
             return (None, None, question)
 
+    @tracing.traced("ask")
+    async def aask(self, question: str, **kwargs):
+        """Async version of ask; SQL runs in a worker thread so other LLM calls keep overlapping"""
+        try:
+            table_name = kwargs.get("table_name")
+            if table_name:
+                question = f"The data is stored in a SQL table named `{table_name}`.\n{question}"
+            sql = await self.agenerate_sql(question, table_name=table_name)
+            print(f"Generated SQL: {sql}")
+            if any(sql.startswith(prefix) for prefix in ["Error:", "HTTP Error:", "Connection Error:", "Timeout Error:"]):
+                print("LLM server error - cannot generate valid SQL")
+                return (None, None, question)
+            if self.db_adapter is not None:
+                try:
+                    df = await asyncio.to_thread(self.db_adapter.run_sql, sql)
+                    return (sql, df, question)
+                except Exception as e:
+                    print(f"Error executing SQL: {e}")
+                    return (sql, None, question)
+            else:
+                return (sql, None, question)
+        except Exception as e:
+            print(f"Error in aask method: {e}")
+            return (None, None, question)
+
 
     def system_message(self, message: str) -> dict:
         return {"role": "system", "content": message}
@@ -177,29 +283,17 @@ Use the database schema provided to understand table structures and relationship
         return {"role": "assistant", "content": message}
 
     def submit_prompt(self, prompt, **kwargs) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": self.model,
-            "messages": prompt,
-            "temperature": 0.1,
-        }
-
         try:
-            response = requests.post(
-                url=f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=100
+            return self.llm_client.chat(
+                prompt,
+                model=self.model,
+                timeout=self.llm_timeout,
+                cache=self.completion_cache or False,
+                temperature=0.1
             )
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            else:
-                print(f"Error Response Text: {response.text}")
-                return f"Error: Server returned {response.status_code}"
+        except LLMError as e:
+            print(f"Error Response Text: {e.text}")
+            return f"Error: Server returned {e.status_code}"
         except requests.exceptions.HTTPError as e:
             print(f"\n=== HTTP Error ===\nError: {e}")
             return f"HTTP Error: {e}"
@@ -213,6 +307,79 @@ Use the database schema provided to understand table structures and relationship
             print(f"\n=== Unexpected Error ===\nError type: {type(e).__name__}\nError: {e}")
             return f"Unexpected Error: {str(e)}"
 
+    def submit_prompt_stream(self, prompt, **kwargs):
+        """Streaming version of submit_prompt: yields tokens as they arrive (errors are yielded as text)"""
+        try:
+            yield from self.llm_client.stream_chat(
+                prompt,
+                model=self.model,
+                timeout=self.llm_timeout,
+                cache=self.completion_cache or False,
+                temperature=0.1
+            )
+        except LLMError as e:
+            print(f"Error Response Text: {e.text}")
+            yield f"Error: Server returned {e.status_code}"
+        except requests.exceptions.ConnectionError as e:
+            print(f"\n=== Connection Error ===\nError: {e}")
+            yield "Connection Error: Cannot connect to LLM server"
+        except requests.exceptions.Timeout as e:
+            print(f"\n=== Timeout Error ===\nError: {e}")
+            yield "Timeout Error: Request timed out"
+        except Exception as e:
+            print(f"\n=== Unexpected Error ===\nError type: {type(e).__name__}\nError: {e}")
+            yield f"Unexpected Error: {str(e)}"
+
+    async def _get_async_llm_client(self) -> AsyncLLMClient:
+        # httpx clients and semaphores belong to one event loop, so keep one client per loop.
+        # The agent is shared across threads, each possibly running its own loop (asyncio.run)
+        loop = asyncio.get_running_loop()
+        with self._async_llm_lock:
+            entry = self._async_llm_clients.get(loop)
+            if entry is not None:
+                return entry[0]
+            # Clients of finished loops were closed at their shutdown; their semaphores may still
+            # reference the loop (keeping the weak key alive), so drop them explicitly
+            for finished in [other for other in self._async_llm_clients if other.is_closed()]:
+                del self._async_llm_clients[finished]
+            client = AsyncLLMClient(
+                self.base_url,
+                api_key=self.api_key,
+                timeout=self.llm_timeout,
+                max_concurrency=self.llm_max_concurrency,
+                cache=self.completion_cache
+            )
+            closer = _close_with_loop(client)
+            self._async_llm_clients[loop] = (client, closer)
+        await closer.asend(None)
+        return client
+
+    async def asubmit_prompt(self, prompt, **kwargs) -> str:
+        """Async version of submit_prompt; at most `llm_max_concurrency` calls are in flight"""
+        import httpx
+
+        try:
+            client = await self._get_async_llm_client()
+            return await client.chat(
+                prompt,
+                model=self.model,
+                timeout=self.llm_timeout,
+                cache=self.completion_cache or False,
+                temperature=0.1
+            )
+        except LLMError as e:
+            print(f"Error Response Text: {e.text}")
+            return f"Error: Server returned {e.status_code}"
+        except httpx.TimeoutException as e:
+            print(f"\n=== Timeout Error ===\nError: {e}")
+            return "Timeout Error: Request timed out"
+        except httpx.TransportError as e:
+            print(f"\n=== Connection Error ===\nError: {e}")
+            return "Connection Error: Cannot connect to LLM server"
+        except Exception as e:
+            print(f"\n=== Unexpected Error ===\nError type: {type(e).__name__}\nError: {e}")
+            return f"Unexpected Error: {str(e)}"
+
     def save_training_data(self, filename="training.json"):
         folder = "training_data"
         if not os.path.exists(folder):
@@ -246,3 +413,36 @@ Use the database schema provided to understand table structures and relationship
             print(f"✅ Added Q&A training data: {question[:50]}...")
         else:
             print("❌ Invalid training data. Must provide ddl, documentation, or both question and sql.")
+
+    def train_many(self, items: list, batch_size: int | None = None) -> list:
+        """Add many training items at once and write them to the vector store in bulk"""
+        valid = [item for item in items if self._entry_text(item)]
+        if len(valid) < len(items):
+            print(f"❌ Skipped {len(items) - len(valid)} invalid training items")
+        self.training_data.extend(valid)
+        return self.add_many(valid, batch_size=batch_size)
+
+
+class LocalVanna(LocalVectorDB, VannaAgent):
+    """Agent backed by the in-process LocalVectorDB (no vector server needed)"""
+    def __init__(self, config, db_adapter: DBAdapter | None = None):
+        LocalVectorDB.__init__(self, config=config)
+        VannaAgent.__init__(self, config, db_adapter)
+
+
+# Agent class per config["vector_store"] as (module, class). Imported only when that backend is
+# used, so VECTOR_STORE=local runs without pymilvus installed
+VECTOR_STORES = {
+    "milvus": ("core.milvus_agent", "MyVanna"),
+    "local": ("core.my_agent", "LocalVanna"),
+}
+
+
+def create_vanna(config, db_adapter: DBAdapter | None = None) -> VannaAgent:
+    """Build the agent for the vector store selected by config["vector_store"] (default: milvus)"""
+    backend = (config or {}).get("vector_store", "milvus")
+    if backend not in VECTOR_STORES:
+        raise ValueError(f"Unknown vector_store '{backend}', expected one of {list(VECTOR_STORES)}")
+    module_name, class_name = VECTOR_STORES[backend]
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+    return agent_class(config, db_adapter)
@@ -0,0 +1,72 @@
+import re
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    # tiktoken is optional; without it token counts are estimated from text length
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = None
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Token count of `text` (exact with tiktoken, ~4 characters per token otherwise)"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def format_context_item(item: dict) -> str:
+    if item["kind"] == "question_sql":
+        return f"Q: {item['question']}\nA: {item['sql']}\n\n"
+    if item["kind"] == "ddl":
+        return f"-- Schema definition:\n{item['text']}\n\n"
+    return f"-- Documentation:\n{item['text']}\n\n"
+
+
+def assemble_context(schema: str, items: list, budget: int) -> dict:
+    """
+    Build the prompt context from the schema and candidate items, in priority order,
+    keeping the total within `budget` tokens. The schema is always included.
+    Items are {"kind": "question_sql", "question", "sql"} or {"kind": "ddl"|"documentation", "text"}.
+    """
+    schema_block = f"-- Database schema:\n{schema}\n\n"
+    schema_tokens = count_tokens(schema_block)
+    used = schema_tokens
+    blocks, chosen, dropped = [schema_block], [], []
+    for item in items:
+        block = format_context_item(item)
+        tokens = count_tokens(block)
+        if used + tokens > budget:
+            dropped.append({**item, "tokens": tokens})
+            continue
+        blocks.append(block)
+        chosen.append({**item, "tokens": tokens})
+        used += tokens
+    return {
+        "text": "".join(blocks),
+        "items": chosen,
+        "dropped": dropped,
+        "schema_tokens": schema_tokens,
+        "total_tokens": used,
+        "budget": budget,
+    }
+
+
+def rank_by_overlap(question: str, items: list, text_of) -> list:
+    """Order items by word overlap with the question (used when no vector search is available)"""
+    words = set(re.findall(r"\w+", question.lower()))
+    scored = [(len(words & set(re.findall(r"\w+", text_of(item).lower()))), i, item) for i, item in enumerate(items)]
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    return [item for _, _, item in scored]
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+
+# Set WARM_UP=0 to skip background warm-up (resources then load on first use)
+WARM_UP = os.getenv("WARM_UP", "1").lower() not in ("0", "false", "off", "no")
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of expensive shared resources (agent, embedding model, vector store
+    connection). Each resource is built by its factory on first use, at most once even when
+    several threads ask at the same time, and then shared by every caller, Streamlit session
+    and rerun in the process. warm_up() builds resources ahead of time in a background thread.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory, replace: bool = False):
+        """Register `factory()` under `name`; an already built instance is kept unless `replace`"""
+        with self._lock:
+            if name in self._factories and not replace:
+                return
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+            if replace:
+                self._instances.pop(name, None)
+
+    def get(self, name: str):
+        """The instance for `name`, building it on first use (other callers wait for the build)"""
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown resource '{name}'")
+            factory, lock = self._factories[name], self._locks[name]
+        with lock:
+            if name in self._instances:
+                return self._instances[name]
+            start = time.perf_counter()
+            try:
+                instance = factory()
+            except Exception as e:
+                self._stats[name] = {"loaded": False, "seconds": time.perf_counter() - start, "error": str(e)}
+                raise
+            self._stats[name] = {"loaded": True, "seconds": time.perf_counter() - start, "error": None}
+            self._instances[name] = instance
+            return instance
+
+    def get_or_create(self, name: str, factory):
+        """register() + get(): the shared instance for `name`, built with `factory` if needed"""
+        self.register(name, factory)
+        return self.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm_up(self, *names: str, background: bool = True, on_load=None):
+        """
+        Build the named resources (all registered ones by default) now. With `background`,
+        they are built in a daemon thread, which is returned; failures are printed, and
+        get() retries the build later. `on_load(name, instance)` runs after each build.
+        """
+        names = names or tuple(self._factories)
+
+        def build():
+            for name in names:
+                try:
+                    instance = self.get(name)
+                    if on_load is not None:
+                        on_load(name, instance)
+                except Exception as e:
+                    print(f"❌ Error warming up '{name}': {e}")
+
+        if not background:
+            build()
+            return None
+        thread = threading.Thread(target=build, name=f"warm-up:{','.join(names)}", daemon=True)
+        thread.start()
+        return thread
+
+    def reset(self, name: str | None = None):
+        """Drop built instance(s); they are rebuilt on next use"""
+        with self._lock:
+            for key in [name] if name is not None else list(self._instances):
+                self._instances.pop(key, None)
+                self._stats.pop(key, None)
+
+    def stats(self) -> dict:
+        """{name: {"loaded", "seconds", "error"}} for every registered resource"""
+        with self._lock:
+            names = list(self._factories)
+        return {name: self._stats.get(name, {"loaded": False, "seconds": None, "error": None}) for name in names}
+
+    def proxy(self, name: str) -> "LazyProxy":
+        return LazyProxy(name, self)
+
+
+class LazyProxy:
+    """
+    Stand-in for a registry resource: attribute reads and writes go to the shared instance,
+    which is built on first access. Lets modules export e.g. `vn` without building it at import.
+    """
+
+    __slots__ = ("_name", "_registry")
+
+    def __init__(self, name: str, registry: ResourceRegistry | None = None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_registry", registry or get_registry())
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._registry.is_loaded(self._name) else "not loaded"
+        return f"<LazyProxy '{self._name}' ({state})>"
+
+
+_registry = ResourceRegistry()
+
+
+def get_registry() -> ResourceRegistry:
+    """The process-wide registry"""
+    return _registry
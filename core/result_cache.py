@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+# Quoted strings/identifiers are kept verbatim; everything else is case- and whitespace-normalized
+_SQL_TOKEN_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)")
+_SQL_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonical form of a query for cache keys: no comments, collapsed whitespace, lowercase keywords, no trailing ;"""
+    parts = _SQL_TOKEN_RE.split(sql)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            part = _SQL_COMMENT_RE.sub(" ", part)
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+# Keywords that make a statement write or change schema (e.g. PostgreSQL's WITH ... DELETE, SELECT ... INTO)
+_WRITE_KEYWORD_RE = re.compile(r"\b(insert|update|delete|merge|create|drop|alter|truncate|into)\b")
+
+
+def is_cacheable(normalized_sql: str) -> bool:
+    """Only read-only queries: SELECT/WITH with no DML/DDL keyword outside quoted strings and identifiers"""
+    if not normalized_sql.startswith(("select", "with")):
+        return False
+    unquoted = "".join(part for i, part in enumerate(_SQL_TOKEN_RE.split(normalized_sql)) if i % 2 == 0)
+    return _WRITE_KEYWORD_RE.search(unquoted) is None
+
+
+class ResultCache:
+    """
+    Memory-bounded LRU of query results (DataFrames).
+
+    Keys combine the normalized SQL with the database's data version (see
+    DBAdapter.get_data_version); results from databases without a data
+    version are reused for `ttl` seconds only. When `spill_dir` is set,
+    entries evicted from memory are written there as Parquet and read back on
+    the next hit instead of re-running the query.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: float = 300.0,
+                 spill_dir: str | None = None, max_spill_bytes: int = 2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self._entries = OrderedDict()   # key -> (df, nbytes, created_at)
+        self._spilled = OrderedDict()   # key -> (path, nbytes, created_at, attrs)
+        self._bytes = 0
+        self._spill_bytes = 0
+        self._lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(normalized_sql: str, data_version, **options) -> str:
+        raw = repr((normalized_sql, data_version, sorted(options.items())))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, expires: bool = False) -> pd.DataFrame | None:
+        """Return a copy of the cached result, or None. `expires` applies the TTL (no data version)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not (expires and now - entry[2] > self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                df = entry[0]
+                return self._copy(df)
+            if entry is not None:
+                self._drop(key)
+            spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            path, nbytes, created_at, attrs = spilled
+            with self._lock:
+                self._spill_bytes -= nbytes
+            if not (expires and now - created_at > self.ttl):
+                try:
+                    df = pd.read_parquet(path)
+                    df.attrs.update(attrs)
+                    with self._lock:
+                        self.hits += 1
+                        self.spill_hits += 1
+                    self._store(key, df, created_at)
+                    return self._copy(df)
+                except Exception as e:
+                    print(f"Error reading spilled result: {e}")
+                finally:
+                    self._remove_file(path)
+            else:
+                self._remove_file(path)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame):
+        self._store(key, self._copy(df), time.time())
+
+    def _store(self, key: str, df: pd.DataFrame, created_at: float):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (df, nbytes, created_at)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                old_key, (old_df, old_bytes, old_created) = self._entries.popitem(last=False)
+                self._bytes -= old_bytes
+                evicted.append((old_key, old_df, old_bytes, old_created))
+        if self.spill_dir:
+            for old_key, old_df, old_bytes, old_created in evicted:
+                self._spill(old_key, old_df, old_bytes, old_created)
+
+    def _spill(self, key: str, df: pd.DataFrame, nbytes: int, created_at: float):
+        path = os.path.join(self.spill_dir, f"{key}.parquet")
+        try:
+            df.to_parquet(path, index=False)
+        except Exception as e:
+            print(f"Error spilling result to Parquet: {e}")
+            return
+        stale = []
+        with self._lock:
+            self._spilled[key] = (path, nbytes, created_at, dict(df.attrs))
+            self._spill_bytes += nbytes
+            while self._spill_bytes > self.max_spill_bytes and self._spilled:
+                _, (old_path, old_bytes, _, _) = self._spilled.popitem(last=False)
+                self._spill_bytes -= old_bytes
+                stale.append(old_path)
+        for old_path in stale:
+            self._remove_file(old_path)
+
+    def _drop(self, key: str):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    @staticmethod
+    def _copy(df: pd.DataFrame) -> pd.DataFrame:
+        # Callers add columns (e.g. __source__) to results, so never hand out the cached frame itself
+        copy = df.copy()
+        copy.attrs = dict(df.attrs)
+        return copy
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            paths = [entry[0] for entry in self._spilled.values()]
+            self._entries.clear()
+            self._spilled.clear()
+            self._bytes = 0
+            self._spill_bytes = 0
+        for path in paths:
+            self._remove_file(path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "spill_hits": self.spill_hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "spilled_entries": len(self._spilled),
+                "spilled_bytes": self._spill_bytes,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    """
+    Process-wide result cache configured from the environment:
+    RESULT_CACHE (set to 0/false/off to disable), RESULT_CACHE_MB, RESULT_CACHE_TTL, RESULT_CACHE_SPILL_DIR.
+    """
+    global _default_cache
+    if os.getenv("RESULT_CACHE", "1").lower() in ("0", "false", "off", "no"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache(
+                max_bytes=int(float(os.getenv("RESULT_CACHE_MB", 256)) * 1024 * 1024),
+                ttl=float(os.getenv("RESULT_CACHE_TTL", 300)),
+                spill_dir=os.getenv("RESULT_CACHE_SPILL_DIR") or None,
+            )
+        return _default_cache
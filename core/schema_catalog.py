@@ -0,0 +1,93 @@
+import threading
+import time
+from sqlalchemy import inspect
+
+
+class SchemaCatalog:
+    """
+    Process-wide cache of table/column metadata, keyed by database URL.
+
+    A cached entry is reused until the database reports a different schema
+    fingerprint (see DBAdapter.get_schema_version). The fingerprint itself is
+    only re-checked every `check_interval` seconds, so building prompts in a
+    loop does no schema I/O at all. Dialects without a fingerprint fall back
+    to reloading the catalog every `ttl` seconds.
+    """
+
+    def __init__(self, check_interval: float = 5.0, ttl: float = 300.0):
+        self.check_interval = check_interval
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_tables(self, db_adapter) -> dict:
+        """Return {table_name: [(column_name, column_type), ...]} for the adapter's database"""
+        return self._get_entry(db_adapter)["tables"]
+
+    def describe(self, db_adapter) -> str:
+        """All tables and their columns, as the schema text used in prompts"""
+        tables = self.get_tables(db_adapter)
+        if not tables:
+            return "No tables found in database."
+        text = "Database Schema:\n"
+        for table_name, columns in tables.items():
+            if not columns:
+                text += f"\nTable {table_name} not found.\n"
+                continue
+            text += f"\nTable: {table_name}\nColumns:\n"
+            for col_name, col_type in columns:
+                text += f"  - {col_name}: {col_type}\n"
+            text += "\n"
+        return text
+
+    def invalidate(self, db_url: str | None = None):
+        """Drop the cached catalog for one database URL, or for all of them"""
+        with self._lock:
+            if db_url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(db_url), None)
+
+    def _get_entry(self, db_adapter) -> dict:
+        key = str(db_adapter.db_url)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry["checked_at"] < self.check_interval:
+            return entry
+
+        version = db_adapter.get_schema_version()
+        if entry is not None:
+            if version is not None and version == entry["version"]:
+                entry["checked_at"] = now
+                return entry
+            if version is None and entry["version"] is None and now - entry["loaded_at"] < self.ttl:
+                entry["checked_at"] = now
+                return entry
+
+        entry = {
+            "version": version,
+            "tables": self._load_tables(db_adapter),
+            "loaded_at": now,
+            "checked_at": now,
+        }
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _load_tables(self, db_adapter) -> dict:
+        inspector = inspect(db_adapter.get_engine())
+        tables = {}
+        for table_name in inspector.get_table_names():
+            columns = []
+            for col in inspector.get_columns(table_name):
+                try:
+                    col_type = str(col["type"])
+                except Exception:
+                    col_type = type(col["type"]).__name__
+                columns.append((col["name"], col_type))
+            tables[table_name] = columns
+        return tables
+
+
+schema_catalog = SchemaCatalog()
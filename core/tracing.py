@@ -0,0 +1,378 @@
+import atexit
+import functools
+import inspect
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Comma-separated sinks, each "kind" or "kind:path":
+#   log[:path]         one JSON line per finished span (default: stderr)
+#   prometheus[:path]  metrics in the Prometheus text format, rewritten after each trace (textfile collector)
+#   otlp[:path]        OTLP/JSON trace export requests, one per line (OpenTelemetry file exporter format)
+# Empty (the default) disables tracing; spans are then no-ops.
+TRACE_SINKS = os.getenv("TRACE_SINKS", "")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "vanna-ai")
+DEFAULT_PATHS = {"prometheus": "traces/metrics.prom", "otlp": "traces/spans.jsonl"}
+
+# Numeric span attributes that are also exported as Prometheus counters
+METRIC_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "rows", "bytes")
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation. Attributes are free-form; see METRIC_ATTRIBUTES for the ones aggregated as metrics."""
+
+    recording = True
+
+    def __init__(self, name: str, parent=None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def add(self, key: str, value) -> "Span":
+        """Accumulate a numeric attribute (e.g. tokens over a stream)"""
+        self.attributes[key] = self.attributes.get(key, 0) + value
+        return self
+
+    def end(self):
+        if self.end_ns is None:
+            self.duration = time.perf_counter() - self._start
+            self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "seconds": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in when tracing is disabled; check `recording` before computing expensive attributes"""
+
+    recording = False
+    name = None
+    attributes = {}
+
+    def set(self, **attributes):
+        return self
+
+    def add(self, key, value):
+        return self
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to its sinks. Spans opened inside another span
+    (in the same thread or asyncio task) become its children.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    @contextmanager
+    def span(self, name: str, activate: bool = True, **attributes):
+        """
+        Time the block as a span named `name`. `activate=False` keeps the span from becoming
+        the parent of spans opened in the block (for generators that yield inside it).
+        """
+        if not self.sinks:
+            yield NOOP_SPAN
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span) if activate else None
+        try:
+            yield span
+        except GeneratorExit:
+            # Consumer stopped early (e.g. a closed stream); not an error
+            span.set(cancelled=True)
+            raise
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if token is not None:
+                try:
+                    _current_span.reset(token)
+                except ValueError:
+                    # Generator finished in another context
+                    pass
+            span.end()
+            self.export(span)
+
+    def export(self, span: Span):
+        for sink in self.sinks:
+            try:
+                sink.export(span)
+            except Exception as e:
+                print(f"Error exporting span to {type(sink).__name__}: {e}")
+        # A finished root span completes a trace (e.g. one pipeline run or question): write the
+        # metrics file and buffered spans now, so long-running processes (Streamlit) export as they go
+        if span.parent_id is None:
+            self.flush()
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.flush()
+            except Exception as e:
+                print(f"Error flushing {type(sink).__name__}: {e}")
+
+
+class LogSink:
+    """Writes each finished span as one JSON line to `path` (appended) or stderr"""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stream = _open_append(path) if path else None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            print(line, file=self._stream or sys.stderr, flush=True)
+
+    def flush(self):
+        pass
+
+
+class PrometheusSink:
+    """
+    Aggregates spans into a duration histogram, an error counter and counters for
+    METRIC_ATTRIBUTES, labelled by span name. render() returns the text exposition
+    format; flush() also writes it to `path` (for node_exporter's textfile collector).
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, path: str | None = None, prefix: str = "vanna"):
+        self.path = path
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._errors = {}
+        self._counters = {}
+
+    def export(self, span: Span):
+        with self._lock:
+            hist = self._durations.setdefault(span.name, {"buckets": [0] * len(self.BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.BUCKETS):
+                if span.duration <= bound:
+                    hist["buckets"][i] += 1
+            hist["sum"] += span.duration
+            hist["count"] += 1
+            if span.status == "error":
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for key in METRIC_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    counter = self._counters.setdefault(key, {})
+                    counter[span.name] = counter.get(span.name, 0) + value
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [f"# HELP {p}_span_duration_seconds Duration of traced stages", f"# TYPE {p}_span_duration_seconds histogram"]
+        with self._lock:
+            for name, hist in sorted(self._durations.items()):
+                label = _label(name)
+                for bound, count in zip(self.BUCKETS, hist["buckets"]):
+                    lines.append(f'{p}_span_duration_seconds_bucket{{span="{label}",le="{bound:g}"}} {count}')
+                lines.append(f'{p}_span_duration_seconds_bucket{{span="{label}",le="+Inf"}} {hist["count"]}')
+                lines.append(f'{p}_span_duration_seconds_sum{{span="{label}"}} {hist["sum"]:.6f}')
+                lines.append(f'{p}_span_duration_seconds_count{{span="{label}"}} {hist["count"]}')
+            lines += [f"# HELP {p}_span_errors_total Spans that ended with an exception", f"# TYPE {p}_span_errors_total counter"]
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'{p}_span_errors_total{{span="{_label(name)}"}} {count}')
+            for key, counter in sorted(self._counters.items()):
+                lines += [f"# HELP {p}_{key}_total Sum of the {key} span attribute", f"# TYPE {p}_{key}_total counter"]
+                for name, value in sorted(counter.items()):
+                    lines.append(f'{p}_{key}_total{{span="{_label(name)}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Write-then-rename so scrapers never read a partial file
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+
+
+class OTLPFileSink:
+    """
+    Appends spans as OTLP/JSON ExportTraceServiceRequest lines, the format of the OpenTelemetry
+    Collector file exporter (readable by its otlpjsonfile receiver). Spans are buffered and
+    written every `batch_size` spans and on flush (after each trace).
+    """
+
+    def __init__(self, path: str, service_name: str = TRACE_SERVICE_NAME, batch_size: int = 64):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer = []
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(self._otlp_span(span))
+            if len(self._buffer) >= self.batch_size:
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        if not self._buffer:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "core.tracing"}, "spans": self._buffer}],
+        }]}
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, ensure_ascii=False, default=str) + "\n")
+        self._buffer = []
+
+    @staticmethod
+    def _otlp_span(span: Span) -> dict:
+        otlp = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items() if v is not None],
+            "status": {"code": 2, "message": span.error} if span.status == "error" else {"code": 1},
+        }
+        if span.parent_id:
+            otlp["parentSpanId"] = span.parent_id
+        return otlp
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _open_append(path: str):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return open(path, "a", encoding="utf-8")
+
+
+SINKS = {
+    "log": LogSink,
+    "prometheus": PrometheusSink,
+    "otlp": OTLPFileSink,
+}
+
+
+def create_sinks(spec: str) -> list:
+    """Sinks from a TRACE_SINKS-style spec, e.g. "log,prometheus:traces/metrics.prom" """
+    sinks = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, path = entry.partition(":")
+        kind = kind.lower()
+        if kind not in SINKS:
+            print(f"Unknown trace sink '{kind}', expected one of {list(SINKS)}")
+            continue
+        sinks.append(SINKS[kind](path or DEFAULT_PATHS.get(kind)))
+    return sinks
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer with the sinks from TRACE_SINKS, flushed after each trace and at interpreter exit"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(create_sinks(TRACE_SINKS))
+                atexit.register(_tracer.flush)
+    return _tracer
+
+
+def span(name: str, activate: bool = True, **attributes):
+    """Shortcut for get_tracer().span(...)"""
+    return get_tracer().span(name, activate=activate, **attributes)
+
+
+def traced(name: str, **attributes):
+    """
+    Decorator: run the function (sync or async) in a span. The body can add attributes with
+    current_span().set(...).
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """Innermost active span, or NOOP_SPAN"""
+    return _current_span.get() or NOOP_SPAN
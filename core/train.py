@@ -1,6 +1,5 @@
-from core.my_agent import MyVanna
 from core.adapter import DBAdapter
-from config.config import vn
+from config.config import VANNA_CONFIG, vn
 
 # Connect to database using adapter
 db_path = "db/ecommerce.db"
@@ -170,7 +169,11 @@ REMEMBER: WHEN YOU USE "SELECT", MUST INCLUDE "FROM TABLE_NAME"!
 - SELECT c.name, COUNT(*) FROM orders o JOIN products p ON o.product_id = p.id JOIN categories c ON p.category_id = c.id GROUP BY c.name
 """)
 
-# === 4. Save training data ===
+# === 4. Write new training data to the vector store in bulk (entries already stored are skipped) ===
+print(f"\n=== Writing training data to the vector store ({VANNA_CONFIG['vector_store']}) ===")
+vn.add_many(vn.training_data)
+
+# === 5. Save training data ===
 print("\n=== Training data summary ===")
 print("Training data in memory:", len(vn.training_data))
 print("Training data content:", vn.training_data[:3] if vn.training_data else "Empty")